@@ -1,5 +1,7 @@
+import os
 from copy import deepcopy
 
+from cloudmesh.common.console import Console
 from cloudmesh.common.util import banner
 from cloudmesh.common.util import path_expand
 from cloudmesh.configuration.Config import Config
@@ -44,6 +46,7 @@ class GoogleCommand(PluginCommand):
                 google config list credentials
                 google list
                 google create [--name=NAME] [--storage=SERVICE]
+                google stats [--file=FILE] [--reset]
                 google bigquery delete
 
 
@@ -53,7 +56,10 @@ class GoogleCommand(PluginCommand):
               FILE   a file name
 
           Options:
-              -f      specify the file
+              -f           specify the file
+              --file=FILE  the json lines file the statistics were
+                           exported to
+              --reset      remove the statistics exported to the file
 
           Description:
           
@@ -81,6 +87,17 @@ class GoogleCommand(PluginCommand):
             
                 TODO 
                 
+            google stats [--file=FILE] [--reset]
+
+                prints the count, failures, retries, bytes, throughput and
+                the p50, p95 and p99 latencies of the storage operations.
+                The statistics are read from the file the providers
+                exported them to with the stats option of the storage
+                service. Without --file the stats option of the service
+                is used and, if it is not a file name,
+                ~/.cloudmesh/google-storage-stats.jsonl. --reset removes
+                the statistics from that file.
+
         """
 
         # variables = Variables()
@@ -93,7 +110,9 @@ class GoogleCommand(PluginCommand):
 
         map_parameters(arguments,
                        'storage',
-                       'name')
+                       'name',
+                       'file',
+                       'reset')
 
 
         name = arguments.storage or "google"
@@ -158,6 +177,33 @@ class GoogleCommand(PluginCommand):
             provider = Provider(service=name)
             provider.create_bucket(bucket)
 
+        elif arguments.stats:
+            from cloudmesh.common.Printer import Printer
+            from cloudmesh.google.storage.stats import Stats
+
+            # the command runs in its own process, so the statistics are
+            # always read from the file the providers exported them to
+            filename = arguments.file
+            if filename is None:
+                try:
+                    filename = Config()[
+                        f"cloudmesh.storage.{name}.default.stats"]
+                except Exception:
+                    filename = None
+                if filename is None or str(filename).lower() == 'true':
+                    filename = Stats.default_file
+            if arguments.reset:
+                Stats.truncate(filename)
+                return ""
+            if not os.path.exists(path_expand(filename)):
+                Console.error(f"No statistics found in {filename}")
+                return ""
+            banner("Google storage statistics")
+            print(Printer.write(
+                list(Stats.load(filename).summary().values()),
+                order=['operation', 'count', 'failed', 'retries', 'bytes',
+                       'bytes_per_sec', 'p50', 'p95', 'p99']))
+
         else:
             raise NotImplementedError
 
@@ -0,0 +1,545 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+from cloudmesh.common.console import Console
+from cloudmesh.common.util import path_expand
+from cloudmesh.google.storage import checksum
+from cloudmesh.google.storage.Provider import Provider
+from cloudmesh.google.storage.stats import stats
+
+
+class StorageError(Exception):
+    """
+    An error response of the google storage json api
+    """
+
+    def __init__(self, code, message):
+        """
+        :param code: the http status code
+        :param message: the body of the response
+        """
+        super().__init__(f'{code}: {message}')
+        self.code = code
+        self.message = message
+
+
+class AsyncProvider(Provider):
+    """
+    An asyncio variant of the google storage provider. get, put, list and
+    delete are coroutines that talk to the json api of google storage with
+    a single aiohttp session, so thousands of small transfers can be in
+    flight without a thread per transfer. The connections option limits the
+    number of open connections and of requests in flight.
+
+    The configuration, the options, the path massaging and the result
+    dicts are the ones of the Provider. aiohttp is only imported when the
+    first request is made::
+
+        async with AsyncProvider(service='google') as provider:
+            result = await provider.put('~/data', 'data', recursive=True)
+    """
+
+    api = 'https://storage.googleapis.com/storage/v1'
+    upload_api = 'https://storage.googleapis.com/upload/storage/v1'
+    scope = 'https://www.googleapis.com/auth/devstorage.full_control'
+
+    def __init__(self, service=None, json=None, **kwargs):
+        super().__init__(service=service, json=json, **kwargs)
+        # the number of connections of the session and of requests in flight
+        self.connections = int(self.option('connections', 256))
+        self._session = None
+        self._semaphore = None
+        self._credentials = None
+        self._token_lock = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def session(self):
+        """
+        the aiohttp session of the provider, created on first use
+        """
+        if self._session is None:
+            try:
+                import aiohttp
+            except ImportError:
+                raise ImportError('The AsyncProvider needs aiohttp, '
+                                  'install it with: pip install aiohttp')
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections),
+                timeout=aiohttp.ClientTimeout(total=None, sock_read=300))
+            self._semaphore = asyncio.Semaphore(self.connections)
+            self._token_lock = asyncio.Lock()
+        return self._session
+
+    async def close(self):
+        """
+        closes the session and its connections
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _token(self):
+        """
+        :return: a valid access token of the service account. Expired
+                 tokens are refreshed in a thread as google.auth is
+                 synchronous.
+        """
+        from google.auth.transport.requests import Request
+        from google.oauth2 import service_account
+
+        async with self._token_lock:
+            if self._credentials is None:
+                self._credentials = service_account.Credentials \
+                    .from_service_account_file(self.path, scopes=[self.scope])
+            if not self._credentials.valid:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self._credentials.refresh, Request())
+            return self._credentials.token
+
+    @staticmethod
+    async def _json(response):
+        return await response.json()
+
+    async def _request(self, operation, method, url, handler=None, size=0,
+                       data=None, headers=None, **kwargs):
+        """
+        sends a request over the connection pool of the session. At most
+        connections requests are in flight, transient errors are retried
+        with an exponential backoff and every request is recorded in the
+        statistics.
+        :param operation: the name of the operation, e.g. get
+        :param method: the http method
+        :param url: the url
+        :param handler: a coroutine function called with the response that
+                        reads its body, by default the json body is returned
+        :param size: the bytes moved by the request
+        :param data: a function returning the body, called for every attempt
+        :param headers: additional headers
+        :return: the result of the handler
+        """
+        import aiohttp
+
+        session = await self.session()
+        retries = 0
+        start = time.time()
+        while True:
+            try:
+                token = await self._token()
+                async with self._semaphore:
+                    async with session.request(
+                            method, url,
+                            headers={**(headers or {}),
+                                     'Authorization': f'Bearer {token}'},
+                            data=None if data is None else data(),
+                            **kwargs) as response:
+                        if response.status >= 400:
+                            raise StorageError(response.status,
+                                               await response.text())
+                        result = await (handler or self._json)(response)
+                stats.record(operation, time.time() - start, size, retries)
+                return result
+            except (StorageError, aiohttp.ClientConnectionError,
+                    aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                transient = not isinstance(e, StorageError) \
+                    or self._transient(e)
+                if retries < self.retries and transient:
+                    retries += 1
+                    await asyncio.sleep(min(0.5 * 2 ** retries, 16))
+                    continue
+                stats.record(operation, time.time() - start, 0, retries,
+                             failed=True)
+                raise
+
+    def _object_url(self, name, api=None):
+        return f'{api or self.api}/b/{quote(self.bucket_name, safe="")}' \
+               f'/o/{quote(name, safe="")}'
+
+    @staticmethod
+    def _item(item):
+        """
+        :param item: an object resource of the json api
+        :return: the compact dict kept in the local index
+        """
+        updated = item.get('updated')
+        if updated is not None:
+            updated = datetime.fromisoformat(
+                updated.replace('Z', '+00:00')).isoformat()
+        return {
+            'name': item['name'],
+            'size': int(item['size']) if 'size' in item else None,
+            'generation': int(item['generation'])
+            if 'generation' in item else None,
+            'crc32c': item.get('crc32c'),
+            'md5': item.get('md5Hash'),
+            'updated': updated,
+            'encoding': item.get('contentEncoding'),
+        }
+
+    def _indexed_item(self, item):
+        if self.index is not None:
+            self.index.put(self.bucket_name, self._item(item))
+
+    def _unindexed_name(self, name):
+        if self.index is not None:
+            self.index.remove(self.bucket_name, name)
+
+    async def _gather(self, function, items):
+        """
+        awaits function(*item) for every item and returns the results. The
+        items are consumed lazily so that at most twice connections tasks
+        exist at a time. If the items raise, e.g. a failing listing, the
+        tasks still pending are cancelled.
+        :param function: the coroutine function to call, it must not raise
+        :param items: an iterable or async iterable of argument tuples
+        :return: list of results
+        """
+        results = []
+        pending = set()
+
+        async def submit(item):
+            nonlocal pending
+            pending.add(asyncio.ensure_future(function(*item)))
+            if len(pending) >= 2 * self.connections:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                results.extend(task.result() for task in done)
+
+        try:
+            if hasattr(items, '__aiter__'):
+                async for item in items:
+                    await submit(item)
+            else:
+                for item in items:
+                    await submit(item)
+            if pending:
+                done, pending = await asyncio.wait(pending)
+                results.extend(task.result() for task in done)
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+        return results
+
+    async def _objects(self, prefix='', delimiter=None, page_size=None,
+                     fields=None):
+        """
+        lists the bucket page by page
+        :param prefix: the prefix
+        :param delimiter: if given, the prefixes are returned as well
+        :param page_size: the number of entries requested per page
+        :param fields: the fields of the items requested per page
+        :return: async generator of the object resources and, with a
+                 delimiter, of dicts with the prefixes
+        """
+        fields = fields or 'name,size,generation,crc32c,md5Hash,updated,' \
+                           'contentEncoding'
+        params = {'fields': f'items({fields}),prefixes,nextPageToken'}
+        if prefix:
+            params['prefix'] = prefix
+        if delimiter:
+            params['delimiter'] = delimiter
+        if page_size:
+            params['maxResults'] = page_size
+        url = f'{self.api}/b/{quote(self.bucket_name, safe="")}/o'
+        while True:
+            page = await self._request('list', 'GET', url, params=params)
+            for prefix in page.get('prefixes', []):
+                yield {'name': prefix, 'prefix': True}
+            for item in page.get('items', []):
+                yield item
+            if 'nextPageToken' not in page:
+                return
+            params['pageToken'] = page['nextPageToken']
+
+    async def list(self, source=None, dir_only=False, recursive=False,
+                   page_size=None, fields=None):
+        """
+        Lists the source: google bucket blob(s) with and without prefix
+        :param source: the prefix
+        :param dir_only: only list the prefixes one level below source
+        :param recursive: not used, the blobs at all levels are listed
+        :param page_size: the number of blobs requested per page
+        :param fields: a comma separated list of the blob properties to
+                       return, e.g. name,size,updated. The default returns
+                       the properties kept in the local index.
+        :return: async generator of dicts
+        """
+        source = Provider.get_filename(source or '')
+        self.storage_dict['action'] = 'list'
+        self.storage_dict['source'] = source
+        if fields is not None and not isinstance(fields, (list, tuple)):
+            fields = [f.strip() for f in fields.split(',')]
+
+        if dir_only:
+            async for item in self._objects(source, delimiter='/',
+                                          page_size=page_size,
+                                          fields='name'):
+                if item.get('prefix'):
+                    yield {'name': item['name']}
+            return
+        async for item in self._objects(
+                source, page_size=page_size,
+                fields=None if fields is None else ','.join(fields)):
+            if fields is None:
+                yield self._item(item)
+            else:
+                yield {field: item.get(field) for field in fields}
+
+    async def print_list(self, source=None, dir_only=False, recursive=False):
+        """
+        prints the names returned by list
+        :param source: the prefix
+        :param dir_only: only print the prefixes one level below source
+        :param recursive: not used, the blobs at all levels are listed
+        :return: dict
+        """
+        print("Bucket: ", self.bucket_name)
+        print("Source keyword: ", source)
+        try:
+            print('Blobs: ')
+            async for blob in self.list(source, dir_only=dir_only,
+                                        recursive=recursive, fields='name'):
+                print(blob['name'])
+        except Exception as e:
+            print('Failed to list blobs from google bucket: ' + str(e))
+        return self.storage_dict
+
+    async def get(self, source=None, destination=None, recursive=False):
+        """
+        Downloads(get) the source(bucket blob) to local storage
+        :param source: the blob name or, with recursive, the prefix
+        :param destination: the local file or directory
+        :param recursive: download all blobs below the source prefix
+        :return: dict
+        """
+        result = self.storage_dict = {}
+        result['action'] = 'get'
+        result['source'] = source
+        result['destination'] = destination
+
+        trimmed_source = self.massage_path(source)
+        trimmed_destination = self.massage_path(destination)
+        start = time.time()
+        try:
+            if recursive:
+                items = self._get_objects(trimmed_source, trimmed_destination)
+            else:
+                path = path_expand(trimmed_destination)
+                if os.path.isdir(path):
+                    path = os.path.join(path,
+                                        os.path.basename(trimmed_source))
+                items = [(trimmed_source, path)]
+            files = await self._gather(self._get_object, items)
+            result['message'] = "Source Downloaded"
+            result['objectlist'] = [f['name'] for f in files]
+            result.update(self._summary(files, start))
+        except Exception as e:
+            Console.error('Failed to download : ' + str(e))
+            result['message'] = str(e)
+        return result
+
+    async def _get_objects(self, source, destination):
+        async for item in self._objects(source, fields='name'):
+            if not item['name'].endswith('/'):
+                yield (item['name'],
+                       path_expand(f'{destination}/{item["name"]}'))
+
+    async def _get_object(self, name, path):
+        """
+        downloads a single blob and reports the outcome. The crc32c of the
+        bytes is compared with the one reported by google storage unless
+        the blob is stored gzip compressed.
+        :param name: the blob name
+        :param path: the local file name
+        :return: dict with name, destination, size, status, time and error
+        """
+        loop = asyncio.get_running_loop()
+        record = {'name': name, 'destination': path, 'size': 0}
+        start = time.time()
+
+        async def handler(response):
+            import google_crc32c
+
+            digest = google_crc32c.Checksum()
+            size = 0
+            f = await loop.run_in_executor(None, open, path, 'wb')
+            try:
+                async for chunk in response.content.iter_chunked(
+                        self.chunk_size):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    await loop.run_in_executor(None, f.write, chunk)
+            finally:
+                await loop.run_in_executor(None, f.close)
+            # the hashes come in one header or in several, each value may
+            # hold a comma separated list, e.g. crc32c=...,md5=...
+            hashes = dict(h.strip().split('=', 1)
+                          for value in response.headers.getall(
+                              'x-goog-hash', [])
+                          for h in value.split(',') if '=' in h)
+            encoding = response.headers.get(
+                'x-goog-stored-content-encoding')
+            if self.verify and encoding != 'gzip' and 'crc32c' in hashes \
+                    and hashes['crc32c'] != checksum.encode(digest.digest()):
+                raise ValueError(f'crc32c mismatch for {name}')
+            return size
+
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            record['size'] = await self._request(
+                'get', 'GET', self._object_url(name),
+                params={'alt': 'media'}, handler=handler)
+            record['status'] = 'ok'
+        except Exception as e:
+            record['status'] = 'failed'
+            record['error'] = str(e)
+        record['time'] = time.time() - start
+        return record
+
+    async def put(self, source=None, destination=None, recursive=None):
+        """
+        Uploads(puts) the source(local) to the destination service bucket
+        :param source: the local file or, with recursive, directory
+        :param destination: the blob name or, with recursive, the prefix
+        :param recursive: upload all files below the source directory
+        :return: dict
+        """
+        result = self.storage_dict = {}
+        result['action'] = 'put'
+        result['source'] = source
+        result['destination'] = destination
+        start = time.time()
+        try:
+            if recursive:
+                items = self._walk(source, destination)
+            else:
+                items = [(path_expand(source),
+                          self.massage_path(destination))]
+            files = await self._gather(self._put_object, items)
+            result['message'] = "Source Uploaded"
+            result['objectlist'] = [f['name'] for f in files]
+            result.update(self._summary(files, start))
+        except Exception as e:
+            Console.error('Failed to upload : ' + str(e))
+            result['message'] = str(e)
+        return result
+
+    async def _put_object(self, path, name):
+        """
+        uploads a single file with a media upload and reports the outcome.
+        The file is read in chunk_size chunks while it is sent and the
+        crc32c of the chunks is compared with the one of the new blob.
+        :param path: the local file name
+        :param name: the blob name
+        :return: dict with name, source, size, status, time and error
+        """
+        import google_crc32c
+
+        loop = asyncio.get_running_loop()
+        record = {'name': name, 'source': path, 'size': 0}
+        start = time.time()
+        digest = {}
+
+        async def chunks():
+            digest['crc32c'] = google_crc32c.Checksum()
+            digest['md5'] = hashlib.md5()
+            f = await loop.run_in_executor(None, open, path, 'rb')
+            try:
+                while True:
+                    chunk = await loop.run_in_executor(
+                        None, f.read, self.chunk_size)
+                    if not chunk:
+                        break
+                    digest['crc32c'].update(chunk)
+                    digest['md5'].update(chunk)
+                    yield chunk
+            finally:
+                await loop.run_in_executor(None, f.close)
+
+        try:
+            record['size'] = os.path.getsize(path)
+            content_type = mimetypes.guess_type(path)[0] or \
+                'application/octet-stream'
+            item = await self._request(
+                'put', 'POST',
+                f'{self.upload_api}/b/{quote(self.bucket_name, safe="")}/o',
+                size=record['size'],
+                params={'uploadType': 'media', 'name': name},
+                headers={'Content-Type': content_type,
+                         'Content-Length': str(record['size'])},
+                data=chunks)
+            record['crc32c'] = checksum.encode(digest['crc32c'].digest())
+            record['md5'] = checksum.encode(digest['md5'].digest())
+            if self.verify and item.get('crc32c') != record['crc32c']:
+                await self._request('delete', 'DELETE',
+                                    self._object_url(name),
+                                    handler=self._discard)
+                raise ValueError(f'crc32c mismatch for {name}')
+            self._indexed_item(item)
+            record['status'] = 'ok'
+        except Exception as e:
+            record['status'] = 'failed'
+            record['error'] = str(e)
+        record['time'] = time.time() - start
+        return record
+
+    @staticmethod
+    async def _discard(response):
+        await response.read()
+
+    async def delete(self, source=None):
+        """
+        Deletes the blobs starting with source from the bucket. The listing
+        is streamed into concurrent delete requests.
+        :param source: the blob name or prefix
+        :return: dict
+        """
+        result = self.storage_dict = {}
+        result['action'] = 'delete'
+        result['source'] = source
+        start = time.time()
+        try:
+            counts = {'deleted': 0, 'not_found': 0, 'failed': 0}
+            names = ((item['name'],) async for item in
+                     self._objects(self.massage_path(source or ''),
+                                 fields='name'))
+            for status in await self._gather(self._delete_object, names):
+                counts[status] += 1
+            result.update(counts)
+            result['seconds'] = time.time() - start
+        except Exception as e:
+            Console.error('Failed to delete : ' + str(e))
+            result['message'] = str(e)
+        return result
+
+    async def _delete_object(self, name):
+        """
+        deletes a single blob
+        :param name: the blob name
+        :return: deleted, not_found or failed
+        """
+        try:
+            await self._request('delete', 'DELETE', self._object_url(name),
+                                handler=self._discard)
+            status = 'deleted'
+        except StorageError as e:
+            if e.code != 404:
+                Console.error(f'Failed to delete {name} : {e}')
+                return 'failed'
+            status = 'not_found'
+        except Exception as e:
+            Console.error(f'Failed to delete {name} : {e}')
+            return 'failed'
+        self._unindexed_name(name)
+        return status
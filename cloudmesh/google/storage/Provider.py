@@ -1,7 +1,22 @@
 from pprint import pprint
+import fnmatch
+import hashlib
+import io
 import json
 import logging
+import mimetypes
+import mmap
 import os
+import re
+import shutil
+import sys
+import tarfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import wait
 from pprint import pprint
 
 from cloudmesh.common.dotdict import dotdict
@@ -10,11 +25,39 @@ from cloudmesh.common.variables import Variables
 from cloudmesh.common.console import Console
 from cloudmesh.configuration.Config import Config
 from cloudmesh.abstract.StorageABC import StorageABC
-from google.cloud import storage
+from cloudmesh.google.storage import checksum
+from cloudmesh.google.storage import pack
+from cloudmesh.google.storage import scheduler
+from cloudmesh.google.storage.blobfile import BlobFile
+from cloudmesh.google.storage.cache import BlobCache
+from cloudmesh.google.storage.client import get_client
+from cloudmesh.google.storage.index import BlobIndex
+from cloudmesh.google.storage.journal import Journal
+from cloudmesh.google.storage.manifest import Manifest
+from cloudmesh.google.storage.pack import PackIndex
+from cloudmesh.google.storage.stats import Stats
+from cloudmesh.google.storage.stats import stats
+from cloudmesh.google.storage.checksum import StreamingDigest
+from cloudmesh.google.storage.stream import GunzipWriter
+from cloudmesh.google.storage.stream import GzipReader
+from cloudmesh.google.storage.stream import HashingReader
+from cloudmesh.google.storage.stream import HashingWriter
+from cloudmesh.google.storage.stream import MappedRange
+from cloudmesh.google.storage.stream import PipeReader
+from cloudmesh.google.storage.stream import ThrottledReader
+from cloudmesh.google.storage.stream import ThrottledWriter
 
 
 class Provider(StorageABC):
 
+    # the listing fields needed to create the records of the local index
+    record_fields = 'items(name,size,generation,crc32c,md5Hash,updated,' \
+                    'contentEncoding),nextPageToken'
+    # the json names of the properties the records keep under another key
+    record_keys = {
+        'md5Hash': 'md5',
+        'contentEncoding': 'encoding',
+    }
 
     sample = """
     cloudmesh:
@@ -143,10 +186,12 @@ class Provider(StorageABC):
         super().__init__(service=service)
         variables=Variables()
         self.debug=variables['debug']
+        self.storage_dict = {}
+        self.kwargs = kwargs
 
         if json:
             self.path = path_expand(json)
-            self.client = storage.Client.from_service_account_json(self.path)
+            self.bucket_name = kwargs.get('bucket')
 
         else:
             self.config = Config()
@@ -158,26 +203,459 @@ class Provider(StorageABC):
             self.path = path_expand("~/.cloudmesh/google.json")
             #print("11111:",self.path)
             #print("bucketName:", self.bucket_name)
-            self.client = storage.Client.from_service_account_json(self.path) #Important for goole login
             self.storage_dict = {}
-            self.bucket = self.client.get_bucket(self.bucket_name)
 
-    def get(self, source=None, destination=None, recursive=False):
+        # number of concurrent transfers used by recursive operations
+        self.workers = int(self.option('workers', 8))
+        # the clients are shared by all providers using the same
+        # credentials, their connection pool serves pool_size connections.
+        # Recursive operations transfer up to workers files and the slices
+        # and parts of large files share another workers threads.
+        self.pool_size = int(self.option('pool_size',
+                                         max(10, 2 * self.workers)))
+        self._client = None
+        # blobs of at least slice_threshold bytes are downloaded in
+        # concurrent byte ranges of slice_size bytes
+        self.slice_threshold = int(self.option('slice_threshold', 256 * 2 ** 20))
+        self.slice_size = int(self.option('slice_size', 64 * 2 ** 20))
+        # files of at least composite_threshold bytes are uploaded as
+        # composite_parts concurrent parts that are composed into the blob
+        self.composite_threshold = int(
+            self.option('composite_threshold', 256 * 2 ** 20))
+        self.composite_parts = min(int(self.option('composite_parts', 32)), 32)
+        # files of at least resumable_threshold bytes are uploaded in
+        # chunk_size chunks of a resumable session recorded in the journal
+        self.resumable_threshold = int(
+            self.option('resumable_threshold', 32 * 2 ** 20))
+        self.chunk_size = int(self.option('chunk_size', 8 * 2 ** 20))
+        # compute crc32c and md5 while transferring and compare them with
+        # the checksums of the blobs
+        self.verify = str(self.option('verify', True)).lower() == 'true'
+        # the extensions of files that are compressed by put with compress,
+        # files with a text/* mime type are compressed as well
+        self.compress_types = self.option(
+            'compress_types',
+            '.txt,.csv,.tsv,.log,.json,.jsonl,.xml,.html,.md,.yaml,.yml,.sql')
+        if isinstance(self.compress_types, str):
+            self.compress_types = self.compress_types.split(',')
+        # all transfers of the process share one token bucket limiting the
+        # bandwidth, transfers of files smaller than small_file_size are
+        # served first
+        self.throttle = scheduler.throttle
+        if self.option('bandwidth') is not None:
+            self.set_bandwidth(self.option('bandwidth'))
+        self.small_file_size = int(self.option('small_file_size', 2 ** 20))
+        # transient errors of a request are retried up to retries times,
+        # the requests are recorded in the statistics of the process
+        self.retries = int(self.option('retries', 3))
+        # the requests are appended to the file given by the stats option,
+        # or to Stats.default_file if it is True, for google stats
+        if self.option('stats') is not None:
+            filename = self.option('stats')
+            if str(filename).lower() == 'true':
+                filename = Stats.default_file
+            stats.export(filename)
+        self._journal = None
+        # seconds after which a prefix of the local index is listed again
+        self.index_max_age = float(self.option('index_max_age', 3600))
+        self._index = None
+        self._cache = None
+        # guards the creation of the lazily created state used by workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._buckets = {}
+        # put_packed closes a shard once it holds shard_size bytes
+        self.shard_size = int(self.option('shard_size', 256 * 2 ** 20))
+        # the indexes of packs read by get_packed
+        self._packs = {}
+        # the blocks read by open, the blocks of the readahead window are
+        # fetched concurrently on sequential reads
+        self.block_size = int(self.option('block_size', 2 ** 20))
+        self.readahead = int(self.option('readahead', 8 * 2 ** 20))
+        self.cache_blocks = int(self.option('cache_blocks', 64))
+
+    @staticmethod
+    def stats():
+        """
+        :return: dict with count, failures, bytes, retries, throughput and
+                 the p50, p95 and p99 latencies of the requests made by
+                 every storage operation of the process
+        """
+        return stats.summary()
+
+    @staticmethod
+    def _transient(e):
+        """
+        :param e: an exception raised by a request
+        :return: True if the request may succeed when it is retried
+        """
+        if getattr(e, 'code', None) in (408, 429, 500, 502, 503, 504):
+            return True
+        return isinstance(e, (ConnectionError, TimeoutError)) or \
+            type(e).__name__ in ('ConnectionError', 'Timeout', 'ReadTimeout',
+                                 'ChunkedEncodingError')
+
+    def _attempt(self, operation, function, *args, size=0, **kwargs):
+        """
+        calls function and retries it on transient errors with an
+        exponential backoff. The latency, bytes and retries are recorded in
+        the statistics under operation.
+        :param operation: the name of the operation, e.g. get, or None if
+                          function is a transfer that records each of its
+                          requests itself
+        :param function: the function making the request
+        :param size: the bytes moved by the request
+        :return: the result of the function and the number of retries
+        """
+        retries = 0
+        start = time.time()
+        while True:
+            try:
+                result = function(*args, **kwargs)
+                if operation is not None:
+                    stats.record(operation, time.time() - start, size,
+                                 retries)
+                return result, retries
+            except Exception as e:
+                if retries < self.retries and self._transient(e):
+                    retries += 1
+                    time.sleep(min(0.5 * 2 ** retries, 16))
+                    continue
+                if operation is not None:
+                    stats.record(operation, time.time() - start, 0, retries,
+                                 failed=True)
+                raise
+
+    @staticmethod
+    def _recorded(operation, nbytes, function, *args, **kwargs):
+        """
+        makes one request of a transfer, e.g. a slice, a part or a chunk,
+        and records it in the statistics under operation
+        :param operation: the name of the operation, e.g. get
+        :param nbytes: the bytes moved by the request
+        :param function: the function making the request
+        :return: the result of the function
+        """
+        start = time.time()
+        try:
+            result = function(*args, **kwargs)
+        except Exception:
+            stats.record(operation, time.time() - start, failed=True)
+            raise
+        stats.record(operation, time.time() - start, nbytes)
+        return result
+
+    @staticmethod
+    def _pages(blobs, operation='list'):
+        """
+        yields the pages of a listing and records the time needed to fetch
+        every page in the statistics
+        :param blobs: the iterator returned by list_blobs
+        :param operation: the name of the operation
+        :return: generator of lists of blobs, with the prefixes of the page
+                 in the attribute prefixes
+        """
+        pages = iter(blobs.pages)
+        while True:
+            start = time.time()
+            try:
+                page = next(pages)
+            except StopIteration:
+                return
+            stats.record(operation, time.time() - start)
+            yield page
+
+    def _items(self, blobs, operation='list'):
+        """
+        :param blobs: the iterator returned by list_blobs
+        :param operation: the name of the operation
+        :return: generator of the blobs of all pages
+        """
+        for page in self._pages(blobs, operation):
+            for blob in page:
+                yield blob
+
+    @staticmethod
+    def set_bandwidth(rate):
+        """
+        limits the bytes per second used by all transfers of the process.
+        The limit can be changed while transfers are running.
+        :param rate: the bytes per second or None for no limit
+        """
+        scheduler.set_bandwidth(rate)
+
+    def _priority(self, size, priority=None):
+        """
+        :param size: the size of the transfer
+        :param priority: the priority given by the caller
+        :return: the priority for the token bucket, lower values first
+        """
+        if priority is not None:
+            return priority
+        return 0 if (size or 0) < self.small_file_size else 1
+
+    @property
+    def client(self):
+        """
+        the storage client, created on first use so that google.cloud is
+        only imported by commands that talk to google storage
+        """
+        if self._client is None:
+            self._client = get_client(self.path,
+                                      project=self.option('project'),
+                                      pool_size=self.pool_size) #Important for goole login
+        return self._client
+
+    @property
+    def bucket(self):
+        """
+        the handle of the bucket of this provider. It is created without a
+        request, use bucket_exists to verify that the bucket exists.
+        """
+        return self._bucket_handle(self.bucket_name)
+
+    def bucket_exists(self, name=None):
+        """
+        :param name: the name of a bucket, defaults to the bucket of this
+                     provider
+        :return: True if the bucket exists
+        """
+        return self._bucket_handle(name or self.bucket_name).exists()
+
+    @property
+    def journal(self):
+        """
+        the journal of interrupted transfers, loaded on first use
+        """
+        with self._lock:
+            if self._journal is None:
+                self._journal = Journal(self.option(
+                    'journal', '~/.cloudmesh/google-storage-journal.jsonl'))
+        return self._journal
+
+    @property
+    def index(self):
+        """
+        the local index of bucket listings or None if the index option is
+        not set. The option is either true or the location of the database.
+        """
+        location = self.option('index', False)
+        if str(location).lower() in ['false', 'none', '0', '']:
+            return None
+        with self._lock:
+            if self._index is None:
+                if str(location).lower() == 'true':
+                    location = '~/.cloudmesh/google-storage-index.db'
+                self._index = BlobIndex(location)
+        return self._index
+
+    @property
+    def cache(self):
+        """
+        the local cache of downloaded blobs or None if the cache option is
+        not set. The option is either true or the cache directory, its size
+        is limited to cache_size bytes. It is created once, also when the
+        workers of a recursive get ask for it at the same time.
+        """
+        location = self.option('cache', False)
+        if str(location).lower() in ['false', 'none', '0', '']:
+            return None
+        with self._lock:
+            if self._cache is None:
+                if str(location).lower() == 'true':
+                    location = '~/.cloudmesh/google-storage-cache'
+                self._cache = BlobCache(
+                    location,
+                    max_bytes=int(self.option('cache_size', 10 * 2 ** 30)),
+                    link=str(self.option('cache_link', False)).lower()
+                    == 'true')
+        return self._cache
+
+    @staticmethod
+    def _record(blob):
+        """
+        :param blob: a blob
+        :return: the compact dict kept in the local index
+        """
+        return {
+            'name': blob.name,
+            'size': blob.size,
+            'generation': blob.generation,
+            'crc32c': blob.crc32c,
+            'md5': blob.md5_hash,
+            'updated': blob.updated.isoformat() if blob.updated else None,
+            'encoding': blob.content_encoding,
+        }
+
+    def _blob(self, record):
+        """
+        :param record: a dict as kept in the local index
+        :return: a blob handle carrying size and checksums of the record
+        """
+        blob = self.bucket.blob(record['name'])
+        blob._properties.update({
+            'size': None if record['size'] is None else str(record['size']),
+            'generation': None if record.get('generation') is None
+            else str(record['generation']),
+            'crc32c': record['crc32c'],
+            'md5Hash': record['md5'],
+            'contentEncoding': record.get('encoding'),
+        })
+        return blob
+
+    def _indexed(self, blob):
+        """
+        records an uploaded or changed blob in the local index
+        :param blob: the blob with its properties loaded
+        """
+        if self.index is not None:
+            self.index.put(self.bucket.name, self._record(blob))
+
+    def _unindexed(self, name):
+        """
+        removes a deleted blob from the local index
+        :param name: the blob name
+        """
+        if self.index is not None:
+            self.index.remove(self.bucket.name, name)
+
+    def refresh_index(self, prefix=''):
+        """
+        lists the blobs below prefix and replaces them in the local index
+        :param prefix: the prefix
+        :return: dict
+        """
+        start = time.time()
+        blobs = self.client.list_blobs(
+            self.bucket,
+            prefix=prefix or None,
+            fields=self.record_fields)
+        count = self.index.refresh(self.bucket.name,
+                                   (self._record(blob)
+                                    for blob in self._items(blobs)),
+                                   prefix=prefix)
+        return {
+            'action': 'refresh_index',
+            'prefix': prefix,
+            'count': count,
+            'seconds': time.time() - start,
+        }
+
+    def invalidate_index(self, prefix=''):
+        """
+        forgets the blobs below prefix in the local index, so that they are
+        listed again on the next use
+        :param prefix: the prefix
+        """
+        if self.index is not None:
+            self.index.invalidate(self.bucket.name, prefix)
+
+    def _listing(self, prefix=''):
+        """
+        the records of the blobs below prefix. If the local index is enabled
+        they come from the index, which is refreshed if it is older than
+        index_max_age, otherwise from a listing of the bucket.
+        :param prefix: the prefix
+        :return: generator of dicts
+        """
+        if self.index is not None:
+            if not self.index.fresh(self.bucket.name, prefix,
+                                    self.index_max_age):
+                self.refresh_index(prefix)
+            return self.index.list(self.bucket.name, prefix)
+        blobs = self.bucket.list_blobs(prefix=prefix or None,
+                                       fields=self.record_fields)
+        return (self._record(blob) for blob in self._items(blobs))
+
+    def _lookup(self, name):
+        """
+        :param name: the blob name
+        :return: the record of the blob or None if it does not exist
+        """
+        if self.index is not None \
+                and self.index.fresh(self.bucket.name, name,
+                                     self.index_max_age):
+            return self.index.get(self.bucket.name, name)
+        blob = self.bucket.get_blob(name)
+        if blob is None:
+            self._unindexed(name)
+            return None
+        self._indexed(blob)
+        return self._record(blob)
+
+    def exists(self, name):
+        """
+        :param name: the blob name
+        :return: True if the blob exists
+        """
+        return self._lookup(name) is not None
+
+    def size(self, name):
+        """
+        :param name: the blob name
+        :return: the size of the blob in bytes or None if it does not exist
+        """
+        record = self._lookup(name)
+        return None if record is None else record['size']
+
+    def option(self, name, default=None):
+        """
+        returns a tuning option. Options passed to the constructor take
+        precedence over the ones found in the default section of the
+        storage entry in the yaml file
+        :param name: the name of the option, e.g. workers
+        :param default: the value used if the option is not set
+        :return: the value of the option
+        """
+        if name in self.kwargs:
+            return self.kwargs[name]
+        try:
+            value = self.configuration["default"][name]
+            if value is not None:
+                return value
+        except Exception:
+            pass
+        return default
+
+    def get(self, source=None, destination=None, recursive=False,
+            workers=None, decompress=True, priority=None):
         """
          Downloads(get) the source(bucket blob) to local storage
          :param source: the source which either can be a directory or file
          :param destination: the destination which either can be a directory or file
+         :param recursive: download all blobs below the source prefix
+         :param workers: the number of concurrent downloads used in recursive
+                         mode, defaults to the workers option
+         :param decompress: decompress blobs stored with gzip content
+                            encoding while downloading, otherwise the
+                            compressed bytes are kept
+         :param priority: the bandwidth priority of the transfers, lower
+                          values first. By default small files go first.
          :return: dict
 
+         With the cache option unchanged blobs are copied from the local
+         cache. With cache_link they are hard linked to the read only cache
+         entries instead, so the downloaded files are read only as well.
+
          """
+        self.storage_dict = {}
         self.storage_dict['action'] = "get"
         self.storage_dict['source'] = source  # src
         self.storage_dict['destination'] = destination
 
+        if destination == '-':
+            return self.get_stream(source, sys.stdout.buffer,
+                                   decompress=decompress, priority=priority)
 
         trimmed_source = self.massage_path(source)
         trimmed_destination = self.massage_path(destination)
 
+        if recursive:
+            return self._get_recursive(trimmed_source, trimmed_destination,
+                                       workers=workers,
+                                       decompress=decompress,
+                                       priority=priority)
+
         try:
             # Excluding any directory from the bucket.
             #filter and list the files which need to download using Google Storage bucket.list_blobs function.
@@ -193,10 +671,16 @@ class Provider(StorageABC):
                 if (blob_name[-1] !='/'):
                     # If blob name contains a prefix eg. a/text1.txt, create folder structure
                     if "/" in blob_name:
-                        blob.download_to_filename(path_expand(f'{trimmed_destination}/{blob_name}'))
+                        self._retrieve(blob,
+                                       path_expand(f'{trimmed_destination}/{blob_name}'),
+                                       decompress=decompress,
+                                       priority=priority)
 
                     else:
-                        blob.download_to_filename(path_expand(f'{trimmed_destination}'))
+                        self._retrieve(blob,
+                                       path_expand(f'{trimmed_destination}'),
+                                       decompress=decompress,
+                                       priority=priority)
                 else:
                     # If blob name is a prefix eg: a/
                     os.makedirs(path_expand(f'{trimmed_destination}'))
@@ -204,73 +688,1520 @@ class Provider(StorageABC):
                     trimmed_destination = trimmed_destination.replace(blob_name, "")
             self.storage_dict['message'] = "Source Downloaded"
             self.storage_dict['objectlist'] = filesDownloaded
+            if self.cache is not None:
+                self.storage_dict['cache'] = self.cache.summary()
             pprint(self.storage_dict)
 
         except Exception as e:
             Console.error('Failed to download : ' + str(e))
-            status = None
-        #Need to add cm to dict and add return
-        #return self.storage_dict
+            self.storage_dict['message'] = str(e)
+        return self.storage_dict
+
+    def _get_recursive(self, source, destination, workers=None,
+                       decompress=True, priority=None):
+        """
+        Downloads all blobs below the prefix source concurrently. The local
+        directory tree is created once before the transfers start.
+        :param source: the massaged prefix in the bucket
+        :param destination: the massaged local directory
+        :param workers: the number of concurrent downloads
+        :param decompress: decompress blobs stored with gzip encoding
+        :param priority: the bandwidth priority of the transfers
+        :return: dict
+        """
+        start = time.time()
+        try:
+            blobs = []
+            directories = set()
+            for record in self._listing(source):
+                blob = self._blob(record)
+                path = path_expand(f'{destination}/{blob.name}')
+                if blob.name.endswith('/'):
+                    directories.add(path)
+                else:
+                    directories.add(os.path.dirname(path))
+                    blobs.append((blob, path, decompress, priority))
+            for directory in sorted(directories):
+                os.makedirs(directory, exist_ok=True)
+
+            files = list(self._concurrent(self._download, blobs,
+                                          workers=workers))
+            self.storage_dict['message'] = "Source Downloaded"
+            self.storage_dict['objectlist'] = [blob.name for blob, _, _, _ in blobs]
+            self.storage_dict.update(self._summary(files, start))
+            if self.cache is not None:
+                self.storage_dict['cache'] = self.cache.summary()
+        except Exception as e:
+            Console.error('Failed to download : ' + str(e))
+            self.storage_dict['message'] = str(e)
+        return self.storage_dict
+
+    def get_stream(self, source, destination=None, decompress=True,
+                   priority=None):
+        """
+        Downloads a blob as a stream of chunks read with chunk_size byte
+        range requests, so that the blob is never held in memory or on disk
+        as a whole. The next chunk is fetched while the current one is
+        consumed.
+        :param source: the blob name
+        :param destination: a writable file object, a file descriptor or -
+                            for stdout. Without destination the chunks are
+                            returned as a generator.
+        :param decompress: decompress a blob stored with gzip encoding
+        :param priority: the bandwidth priority of the transfer, lower
+                         values first
+        :return: generator of bytes or, with destination, dict
+        """
+        name = self.massage_path(source)
+        if destination is None:
+            return self._chunks_of(name, decompress, priority)
+
+        self.storage_dict = {}
+        self.storage_dict['action'] = 'get'
+        self.storage_dict['source'] = source
+        self.storage_dict['destination'] = destination
+        if destination == '-':
+            destination = sys.stdout.buffer
+        elif isinstance(destination, int):
+            destination = open(destination, 'wb', closefd=False)
+        start = time.time()
+        try:
+            size = 0
+            for chunk in self._chunks_of(name, decompress, priority):
+                destination.write(chunk)
+                size += len(chunk)
+            destination.flush()
+            seconds = time.time() - start
+            self.storage_dict['size'] = size
+            self.storage_dict['seconds'] = seconds
+            self.storage_dict['bytes_per_sec'] = \
+                size / seconds if seconds > 0 else 0
+            self.storage_dict['message'] = "Source Downloaded"
+        except Exception as e:
+            Console.error('Failed to download stream : ' + str(e))
+            self.storage_dict['message'] = str(e)
+        return self.storage_dict
+
+    def _chunks_of(self, name, decompress=True, priority=None):
+        """
+        :param name: the blob name
+        :param decompress: decompress a blob stored with gzip encoding
+        :param priority: the bandwidth priority of the transfer
+        :return: generator of the chunks of the blob. The generation of the
+                 blob is pinned, so a blob replaced while it is read is not
+                 mixed with the new one. The crc32c of the stored bytes is
+                 verified after the last chunk.
+        """
+        found = self.bucket.get_blob(name)
+        if found is None:
+            raise ValueError(f'{name} does not exist')
+        size = found.size or 0
+        priority = self._priority(size, priority)
+        gzipped = found.content_encoding == 'gzip'
+        blob = self.bucket.blob(name, generation=found.generation)
+        decompressor = zlib.decompressobj(31) \
+            if gzipped and decompress else None
+        digest = StreamingDigest() if self.verify else None
+
+        def fetch(start, end):
+            self.throttle.consume(end - start + 1, priority)
+            data, _ = self._attempt('get', blob.download_as_bytes,
+                                    size=end - start + 1,
+                                    start=start, end=end,
+                                    raw_download=gzipped,
+                                    checksum=None)
+            if len(data) != end - start + 1:
+                raise ValueError(f'Short read of {name} at {start}')
+            return data
+
+        ranges = [(start, min(start + self.chunk_size, size) - 1)
+                  for start in range(0, size, self.chunk_size)]
+        try:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                pending = [executor.submit(fetch, *r) for r in ranges[:1]]
+                for i in range(len(ranges)):
+                    data = pending.pop(0).result()
+                    if i + 1 < len(ranges):
+                        # the next chunk is fetched while this one is
+                        # consumed
+                        pending.append(
+                            executor.submit(fetch, *ranges[i + 1]))
+                    if digest is not None:
+                        digest.update(data)
+                    yield data if decompressor is None \
+                        else decompressor.decompress(data)
+            if decompressor is not None:
+                yield decompressor.flush()
+            if digest is not None:
+                digest.verify(name, found.crc32c, found.md5_hash)
+        finally:
+            # stops the hashing thread if the transfer failed or the
+            # consumer did not read all chunks
+            if digest is not None:
+                digest.close()
+
+    def _retrieve(self, blob, path, decompress=True, priority=None):
+        """
+        downloads a blob into the file path through the local cache. The
+        generation of the blob is taken from the listing or, if it is not
+        known, from a metadata request. An unchanged blob is placed from
+        the cache without a download.
+        :param blob: the blob
+        :param path: the local file name
+        :param decompress: decompress a blob stored with gzip encoding
+        :param priority: the bandwidth priority of the transfer
+        :return: the dict returned by _fetch, with cache set to hit or miss
+                 if the cache is used, and the number of retries
+        """
+        key = None
+        if self.cache is not None:
+            if blob.generation is None:
+                blob.reload()
+            raw = blob.content_encoding == 'gzip' and not decompress
+            key = self.cache.key(self.bucket.name, blob.name,
+                                 blob.generation, raw=raw)
+            if self.cache.fetch(key, path):
+                return {'cache': 'hit'}, 0
+            if os.path.lexists(path):
+                # a read only link to an entry of an older generation
+                os.remove(path)
+        info, retries = self._attempt(None, self._fetch, blob, path,
+                                      size=blob.size,
+                                      decompress=decompress,
+                                      priority=priority)
+        if key is not None:
+            self.cache.store(key, path)
+            info['cache'] = 'miss'
+        return info, retries
+
+    def _pack_index(self, prefix, refresh=False):
+        """
+        :param prefix: the prefix of a pack
+        :param refresh: read the index again even if it was read before
+        :return: the PackIndex of the pack, kept in memory once it is read
+        """
+        key = (self.bucket.name, prefix)
+        if refresh or key not in self._packs:
+            data, _ = self._attempt(
+                'get', self.bucket.blob(f'{prefix}/pack-index.json')
+                .download_as_bytes, checksum=None)
+            self._packs[key] = PackIndex.loads(data)
+        return self._packs[key]
+
+    def get_packed(self, source, member=None, destination=None,
+                   workers=None, refresh=False):
+        """
+        Reads members of a pack uploaded with put_packed. A single member is
+        fetched with one byte range request of its shard. Without member
+        all shards are streamed and extracted below destination.
+        :param source: the prefix of the pack in the bucket
+        :param member: the name of a member relative to the packed directory
+        :param destination: the local file or, without member, directory.
+                            Without destination the bytes of the member are
+                            returned.
+        :param workers: the number of shards extracted concurrently
+        :param refresh: read the pack index again
+        :return: the bytes of the member or dict
+        """
+        prefix = self.massage_path(source).rstrip('/')
+        if member is not None and destination is None:
+            return self._member(prefix, member, refresh)
+
+        self.storage_dict = {}
+        self.storage_dict['action'] = 'get'
+        self.storage_dict['source'] = source
+        self.storage_dict['destination'] = destination
+        start = time.time()
+        try:
+            if member is not None:
+                data = self._member(prefix, member, refresh)
+                path = path_expand(destination)
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(data)
+                self.storage_dict['size'] = len(data)
+                self.storage_dict['seconds'] = time.time() - start
+            else:
+                index = self._pack_index(prefix, refresh)
+                files = list(self._concurrent(
+                    self._unpack,
+                    ((name, path_expand(destination))
+                     for name in index.shards),
+                    workers=workers))
+                self.storage_dict.update(self._summary(files, start))
+                self.storage_dict['objectlist'] = index.shards
+            self.storage_dict['message'] = "Source Downloaded"
+        except Exception as e:
+            Console.error('Failed to unpack : ' + str(e))
+            self.storage_dict['message'] = str(e)
+        return self.storage_dict
+
+    def _member(self, prefix, member, refresh=False):
+        """
+        :param prefix: the prefix of a pack
+        :param member: the name of the member
+        :param refresh: read the pack index again
+        :return: the bytes of the member, read with a byte range request
+        """
+        entry = self._pack_index(prefix, refresh).get(member)
+        if entry is None:
+            raise ValueError(f'{member} is not in the pack {prefix}')
+        if entry['length'] == 0:
+            return b''
+        blob = self.bucket.blob(entry['shard'])
+        data, _ = self._attempt('get', blob.download_as_bytes,
+                                size=entry['length'],
+                                start=entry['offset'],
+                                end=entry['offset'] + entry['length'] - 1,
+                                checksum=None)
+        if self.verify \
+                and checksum.encode(self._crc32c(data)) != entry['crc32c']:
+            raise ValueError(f'crc32c mismatch for {member}')
+        return data
+
+    @staticmethod
+    def _crc32c(data):
+        import google_crc32c
+
+        return google_crc32c.Checksum(data).digest()
+
+    def _unpack(self, name, directory):
+        """
+        streams a shard and extracts its members below directory
+        :param name: the name of the shard
+        :param directory: the local directory
+        :return: dict with name, size, members, status, time and error
+        """
+        record = {'name': name, 'size': 0, 'members': 0}
+        start = time.time()
+        root = os.path.abspath(directory)
+        try:
+            stream = PipeReader(self._chunks_of(name))
+            with tarfile.open(fileobj=stream, mode='r|') as tar:
+                for info in tar:
+                    if not info.isfile():
+                        continue
+                    path = os.path.abspath(os.path.join(root, info.name))
+                    if not path.startswith(root + os.sep):
+                        raise ValueError(f'{info.name} is outside of '
+                                         f'{directory}')
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, 'wb') as f:
+                        shutil.copyfileobj(tar.extractfile(info), f,
+                                           2 ** 20)
+                    record['size'] += info.size
+                    record['members'] += 1
+            record['status'] = 'ok'
+        except Exception as e:
+            record['status'] = 'failed'
+            record['error'] = str(e)
+        record['time'] = time.time() - start
+        return record
+
+    def open(self, name, mode='rb', block_size=None, readahead=None,
+             cache_blocks=None, priority=None):
+        """
+        opens a blob as a read only, seekable file object backed by byte
+        range requests, so that readers only fetch the parts of the blob
+        they need. The generation of the blob is pinned when it is opened.
+        Blobs stored gzip compressed are read as stored.
+        :param name: the blob name
+        :param mode: rb for a binary or r for a text file object
+        :param block_size: the size of the range requests, defaults to the
+                           block_size option
+        :param readahead: the bytes fetched ahead of sequential reads,
+                          defaults to the readahead option
+        :param cache_blocks: the number of blocks kept in the cache,
+                             defaults to the cache_blocks option
+        :param priority: the bandwidth priority of the reads
+        :return: BlobFile or, in text mode, a TextIOWrapper around it
+        """
+        if mode not in ('rb', 'r'):
+            raise ValueError(f'Unsupported mode {mode}, use rb or r')
+        name = self.massage_path(name)
+        found = self.bucket.get_blob(name)
+        if found is None:
+            raise FileNotFoundError(f'{name} does not exist')
+        blob = self.bucket.blob(name, generation=found.generation)
+        priority = 0 if priority is None else priority
+
+        def fetch(start, end):
+            self.throttle.consume(end - start + 1, priority)
+            data, _ = self._attempt('get', blob.download_as_bytes,
+                                    size=end - start + 1,
+                                    start=start, end=end,
+                                    raw_download=True,
+                                    checksum=None)
+            if len(data) != end - start + 1:
+                raise ValueError(f'Short read of {name} at {start}')
+            return data
+
+        block_size = int(block_size or self.block_size)
+        readahead = self.readahead if readahead is None else int(readahead)
+        f = BlobFile(fetch, name, found.size or 0,
+                     block_size=block_size,
+                     readahead=readahead,
+                     cache_blocks=int(cache_blocks or self.cache_blocks),
+                     workers=max(1, min(self.workers,
+                                        -(-readahead // block_size))))
+        if mode == 'r':
+            return io.TextIOWrapper(io.BufferedReader(f, block_size))
+        return f
+
+    def _download(self, blob, path, decompress=True, priority=None):
+        """
+        downloads a single blob and reports the outcome
+        :param blob: the blob
+        :param path: the local file name
+        :param decompress: decompress a blob stored with gzip encoding
+        :param priority: the bandwidth priority of the transfer
+        :return: dict with name, destination, size, status, retries, time
+                 and error
+        """
+        record = {
+            'name': blob.name,
+            'destination': path,
+            'size': blob.size or 0,
+        }
+        start = time.time()
+        try:
+            info, record['retries'] = self._retrieve(
+                blob, path, decompress=decompress, priority=priority)
+            record.update(info)
+            record['status'] = 'ok'
+        except Exception as e:
+            record['status'] = 'failed'
+            record['error'] = str(e)
+        record['time'] = time.time() - start
+        return record
+
+    def _send(self, path, name, manifest=None, compress=False,
+              priority=None):
+        """
+        uploads the file path to the blob name. Files of at least
+        composite_threshold bytes are uploaded as a composite.
+        :param path: the local file name
+        :param name: the blob name
+        :param manifest: if given, the local manifest in which the digests
+                         of the file are recorded
+        :param compress: gzip compress the file if its type is compressible
+        :param priority: the bandwidth priority of the transfer
+        :return: dict with additional information about the upload
+        """
+        size = os.path.getsize(path)
+        priority = self._priority(size, priority)
+        if compress and self._compressible(path):
+            info = self._send_gzip(path, name, size, priority=priority)
+        elif size >= self.composite_threshold:
+            info = self._send_composite(path, name, priority=priority)
+        elif size >= self.resumable_threshold:
+            info = self._send_resumable(path, name, priority=priority)
+        else:
+            info = self._send_plain(path, name, size, priority=priority)
+        if manifest is not None and info.get('crc32c') is not None:
+            manifest.stat(path)
+            manifest.set(path,
+                         crc32c=info['crc32c'],
+                         md5=info.get('md5'))
+        return info
+
+    def _compressible(self, path):
+        """
+        :param path: the local file name
+        :return: True if the extension of the file is in compress_types or
+                 its mime type is text
+        """
+        extension = os.path.splitext(path)[1].lower()
+        mime = mimetypes.guess_type(path)[0] or ''
+        return extension in self.compress_types or mime.startswith('text/')
+
+    def _send_gzip(self, path, name, size, priority=0):
+        """
+        uploads the file path gzip compressed with gzip content encoding.
+        The file is compressed while it is read, so the compressed size is
+        not known in advance and the upload uses a resumable session with
+        chunk_size chunks.
+        :param path: the local file name
+        :param name: the blob name
+        :param size: the size of the file
+        :param priority: the bandwidth priority of the transfer
+        :return: dict with the compression ratio and the time saved
+        """
+        chunk_size = max(1, self.chunk_size // 2 ** 18) * 2 ** 18
+        blob = self.bucket.blob(name, chunk_size=chunk_size)
+        blob.content_encoding = 'gzip'
+        start = time.time()
+        digest = StreamingDigest() if self.verify else None
+        try:
+            with open(path, 'rb') as f:
+                reader = GzipReader(f)
+                stream = reader if digest is None \
+                    else HashingReader(reader, digest)
+                try:
+                    blob.upload_from_file(
+                        ThrottledReader(stream, self.throttle, priority),
+                        content_type=mimetypes.guess_type(path)[0],
+                        checksum=None)
+                except Exception:
+                    stats.record('put', time.time() - start, failed=True)
+                    raise
+                # the compressed size is only known after the upload
+                stats.record('put', time.time() - start, reader.bytes_out)
+            if digest is not None:
+                # the digest of the compressed data is not the one of the
+                # file and is therefore not returned
+                self._verified(digest, blob)
+        finally:
+            if digest is not None:
+                digest.close()
+        info = {}
+        self._indexed(blob)
+        info.update(self._compression(size, reader.bytes_out,
+                                      time.time() - start))
+        return info
+
+    def _send_plain(self, path, name, size, priority=0):
+        """
+        uploads the file path in a single request. With verify the digest
+        of the file is computed while it is read.
+        :param path: the local file name
+        :param name: the blob name
+        :param size: the size of the file
+        :param priority: the bandwidth priority of the transfer
+        :return: dict with the digests of the file
+        """
+        blob = self.bucket.blob(name)
+        digest = StreamingDigest() if self.verify else None
+        try:
+            with open(path, 'rb') as f:
+                stream = f if digest is None else HashingReader(f, digest)
+                self._recorded(
+                    'put', size, blob.upload_from_file,
+                    ThrottledReader(stream, self.throttle, priority),
+                    size=size,
+                    content_type=mimetypes.guess_type(path)[0],
+                    checksum=None)
+            info = {} if digest is None else self._verified(digest, blob)
+        finally:
+            if digest is not None:
+                digest.close()
+        self._indexed(blob)
+        return info
+
+    @staticmethod
+    def _verified(digest, blob):
+        """
+        compares the digest of uploaded data with the checksums of the
+        blob and deletes the blob on mismatch
+        :param digest: the StreamingDigest of the uploaded data
+        :param blob: the blob with the properties returned by the upload
+        :return: dict with the digests
+        """
+        try:
+            return digest.verify(blob.name, blob.crc32c, blob.md5_hash)
+        except ValueError:
+            blob.delete()
+            raise
 
-    def put(self, source=None, destination=None, recursive=None ):
+    def _send_resumable(self, path, name, priority=0):
+        """
+        uploads the file path in a resumable upload session. The session
+        uri and the offset confirmed by the server are recorded in the
+        journal after every chunk, so that uploading the same unchanged file
+        again continues the session where it stopped.
+        :param path: the local file name
+        :param name: the blob name
+        :param priority: the bandwidth priority of the transfer
+        :return: dict with the offset the upload was resumed from
+        """
+        key = f'put:{self.bucket.name}/{name}'
+        stat = os.stat(path)
+        size = stat.st_size
+        state = self.journal.get(key)
+        offset = None
+        if state is not None \
+                and state['source'] == path \
+                and state['size'] == size \
+                and state['mtime'] == stat.st_mtime:
+            offset = self._session_offset(state['uri'], size)
+        if offset is None:
+            state = {
+                'source': path,
+                'size': size,
+                'mtime': stat.st_mtime,
+                'uri': self.bucket.blob(name).create_resumable_upload_session(
+                    size=size),
+            }
+            offset = 0
+        resumed = offset
+
+        # the chunk size of a resumable upload must be a multiple of 256 KiB
+        chunk_size = max(1, self.chunk_size // 2 ** 18) * 2 ** 18
+        digest = StreamingDigest() if self.verify else None
+        digest_end = resumed
+
+        def send(uri, offset, chunk):
+            end = offset + len(chunk) - 1
+            response = self.client._http.put(
+                uri,
+                data=chunk,
+                headers={'Content-Range': f'bytes {offset}-{end}/{size}'})
+            return self._confirmed_offset(response, size)
+        try:
+            with open(path, 'rb') as f:
+                if digest is not None:
+                    # the bytes sent by the interrupted run
+                    for chunk in iter(lambda: f.read(
+                            min(chunk_size, resumed - f.tell())), b''):
+                        digest.update(chunk)
+                while offset < size:
+                    state['offset'] = offset
+                    self.journal.put(key, state)
+                    f.seek(offset)
+                    chunk = f.read(chunk_size)
+                    if digest is not None \
+                            and offset + len(chunk) > digest_end:
+                        digest.update(chunk[digest_end - offset:])
+                        digest_end = offset + len(chunk)
+                    self.throttle.consume(len(chunk), priority)
+                    offset = self._recorded('put', len(chunk), send,
+                                            state['uri'], offset, chunk)
+            self.journal.remove(key)
+            info = {'resumed_from': resumed}
+            if digest is not None or self.index is not None:
+                blob = self.bucket.get_blob(name)
+                if digest is not None:
+                    info.update(self._verified(digest, blob))
+                self._indexed(blob)
+        finally:
+            if digest is not None:
+                digest.close()
+        return info
+
+    def _session_offset(self, uri, size):
+        """
+        asks the server how many bytes of a resumable session it has
+        :param uri: the session uri
+        :param size: the size of the upload
+        :return: the offset to continue from or None if the session expired
+        """
+        response = self.client._http.put(
+            uri, data=b'', headers={'Content-Range': f'bytes */{size}'})
+        if response.status_code in (404, 410):
+            return None
+        return self._confirmed_offset(response, size)
+
+    @staticmethod
+    def _confirmed_offset(response, size):
+        """
+        :param response: the response to a request of a resumable session
+        :param size: the size of the upload
+        :return: the number of bytes persisted by the server
+        """
+        from google.api_core import exceptions
+
+        if response.status_code in (200, 201):
+            return size
+        if response.status_code == 308:
+            confirmed = response.headers.get('Range')
+            if confirmed is None:
+                return 0
+            return int(confirmed.split('-')[-1]) + 1
+        # the exception carries the status in code, so that _attempt retries
+        # transient errors and the upload resumes from the journal
+        raise exceptions.from_http_response(response)
+
+    def _send_composite(self, path, name, priority=0):
+        """
+        uploads a large file as a parallel composite upload. The file is
+        memory mapped and split into composite_parts parts that are uploaded
+        concurrently as temporary blobs, composed into the blob name and
+        deleted afterwards. The part names are derived from the bucket, the
+        name and the path, size and mtime of the file, and every uploaded
+        part is recorded in the journal, so that uploading the same
+        unchanged file again only sends the missing parts. Parts left by an
+        upload of another version of the file are removed.
+        :param path: the local file name
+        :param name: the blob name
+        :param priority: the bandwidth priority of the transfer
+        :return: dict with the timing of the parts
+        """
+        key = f'compose:{self.bucket.name}/{name}'
+        stat = os.stat(path)
+        size = stat.st_size
+        part_size = -(-size // self.composite_parts)
+        tag = hashlib.sha1(
+            f'{self.bucket.name}/{name}/{path}/{size}/{stat.st_mtime}/'
+            f'{part_size}'.encode('utf-8')).hexdigest()[:8]
+        state = self.journal.get(key)
+        if state is None or state['tag'] != tag:
+            state = {'tag': tag, 'parts': {}}
+        self._remove_parts(name, keep=tag)
+        parts = []
+        for i, start in enumerate(range(0, size, part_size)):
+            parts.append({
+                'name': f'{name}.cm-part-{i:02d}-{tag}',
+                'start': start,
+                'size': min(part_size, size - start),
+            })
+        lock = threading.Lock()
+
+        with open(path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+
+            def send(part):
+                start = time.time()
+                crc32c = state['parts'].get(part['name'])
+                if crc32c is not None:
+                    # uploaded by an interrupted run
+                    found = self.bucket.get_blob(part['name'])
+                    if found is not None and found.size == part['size'] \
+                            and found.crc32c == crc32c:
+                        part['resumed'] = True
+                        part['time'] = time.time() - start
+                        return
+                blob = self.bucket.blob(part['name'])
+                with MappedRange(mapped,
+                                 part['start'],
+                                 part['start'] + part['size']) as view:
+                    digest = StreamingDigest() if self.verify else None
+                    stream = view if digest is None \
+                        else HashingReader(view, digest)
+                    try:
+                        self._recorded(
+                            'put', part['size'], blob.upload_from_file,
+                            ThrottledReader(stream, self.throttle, priority),
+                            size=part['size'],
+                            checksum=None)
+                        if digest is not None:
+                            self._verified(digest, blob)
+                    finally:
+                        if digest is not None:
+                            digest.close()
+                with lock:
+                    state['parts'][part['name']] = blob.crc32c
+                    self.journal.put(key, state)
+                part['time'] = time.time() - start
+
+            self._run_parts(send, [(part,) for part in parts])
+            start = time.time()
+            blob = self.bucket.blob(name)
+            self._recorded(
+                'compose', 0, blob.compose,
+                [self.bucket.blob(part['name']) for part in parts])
+            compose_time = time.time() - start
+            self._indexed(blob)
+
+        # the parts are kept for the next run until the composite exists
+        self.journal.remove(key)
+        for part in parts:
+            try:
+                self.bucket.blob(part['name']).delete()
+            except Exception:
+                pass
+        # the crc32c of the composite is computed by the server from the
+        # verified parts
+        return {'parts': parts,
+                'resumed_parts': sum(1 for part in parts
+                                     if part.get('resumed')),
+                'compose_time': compose_time,
+                'crc32c': blob.crc32c}
+
+    def _remove_parts(self, name, keep=None):
+        """
+        deletes the temporary parts of composite uploads of the blob name
+        :param name: the blob name
+        :param keep: the tag of the parts that are kept
+        """
+        blobs = self.client.list_blobs(self.bucket,
+                                       prefix=f'{name}.cm-part-',
+                                       fields='items(name),nextPageToken')
+        for blob in self._items(blobs):
+            if keep is not None and blob.name.endswith(f'-{keep}'):
+                continue
+            try:
+                blob.delete()
+            except Exception:
+                pass
+
+    def _fetch(self, blob, path, decompress=True, priority=None):
+        """
+        downloads a blob into the file path. Blobs of at least
+        slice_threshold bytes are downloaded in slices. Blobs stored with
+        gzip content encoding are downloaded as stored and decompressed
+        while they are written if decompress is set.
+        :param blob: the blob as returned by a listing
+        :param path: the local file name
+        :param decompress: decompress a blob stored with gzip encoding
+        :param priority: the bandwidth priority of the transfer
+        :return: dict with the digests of the file
+        """
+        priority = self._priority(blob.size, priority)
+        gzipped = blob.content_encoding == 'gzip'
+        if not gzipped and blob.size is not None \
+                and blob.size >= self.slice_threshold:
+            self._fetch_sliced(blob, path, priority=priority)
+            return {'crc32c': blob.crc32c}
+        digest = StreamingDigest() if self.verify else None
+        start = time.time()
+        try:
+            with open(path, 'wb') as f:
+                writer = gunzip = GunzipWriter(f) \
+                    if gzipped and decompress else f
+                if digest is not None:
+                    writer = HashingWriter(writer, digest)
+                self._recorded(
+                    'get', blob.size or 0, blob.download_to_file,
+                    ThrottledWriter(writer, self.throttle, priority),
+                    raw_download=gzipped,
+                    checksum=None)
+                if gunzip is not f:
+                    gunzip.finish()
+            # the digest is taken from the bytes as stored in the bucket
+            info = {}
+            if digest is not None:
+                info = digest.verify(blob.name, blob.crc32c, blob.md5_hash)
+        except ValueError:
+            os.remove(path)
+            raise
+        finally:
+            if digest is not None:
+                digest.close()
+        if gunzip is not f:
+            info.update(self._compression(gunzip.bytes_out, gunzip.bytes_in,
+                                          time.time() - start))
+        return info
+
+    @staticmethod
+    def _compression(size, compressed, seconds):
+        """
+        :param size: the uncompressed size
+        :param compressed: the compressed size
+        :param seconds: the time used for the transfer
+        :return: dict with the compression ratio and an estimate of the
+                 transfer time saved at the observed throughput
+        """
+        saved = 0
+        if compressed and seconds > 0:
+            saved = (size - compressed) * seconds / compressed
+        return {
+            'compressed_size': compressed,
+            'compression_ratio': size / compressed if compressed else 0,
+            'time_saved': saved,
+        }
+
+    def _fetch_sliced(self, blob, path, priority=0):
+        """
+        downloads a blob in concurrent byte range requests of slice_size
+        bytes. Each slice is written at its offset into the preallocated
+        file, so the object is never held in memory as a whole. With verify
+        every slice is hashed when it arrives and the crc32c of the slices
+        are combined and compared with the one of the blob; the file is
+        removed on mismatch.
+        :param blob: the blob as returned by a listing
+        :param path: the local file name
+        :param priority: the bandwidth priority of the transfer
+        """
+        size = blob.size
+        with open(path, 'wb') as f:
+            f.truncate(size)
+        fd = os.open(path, os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+
+        def fetch(start, end):
+            self.throttle.consume(end - start + 1, priority)
+            data = self._recorded('get', end - start + 1,
+                                  blob.download_as_bytes,
+                                  start=start, end=end, checksum=None)
+            if len(data) != end - start + 1:
+                raise ValueError(f'Short read of {blob.name} at {start}')
+            if hasattr(os, 'pwrite'):
+                os.pwrite(fd, data, start)
+            else:
+                with open(path, 'r+b') as f:
+                    f.seek(start)
+                    f.write(data)
+            return google_crc32c.value(data) if verify else None
+
+        verify = self.verify and blob.crc32c is not None
+        if verify:
+            import google_crc32c
+        try:
+            slices = [(start, min(start + self.slice_size, size) - 1)
+                      for start in range(0, size, self.slice_size)]
+            crcs = self._run_parts(fetch, slices)
+            if verify:
+                # the slices complete out of order, so their crc32c are
+                # combined in the order of the file instead of hashing the
+                # file again
+                crc = 0
+                for (start, end), value in zip(slices, crcs):
+                    crc = checksum.crc32c_combine(crc, value, end - start + 1)
+                if checksum.encode(crc.to_bytes(4, 'big')) != blob.crc32c:
+                    raise ValueError(f'crc32c mismatch for {blob.name}')
+        except Exception:
+            os.close(fd)
+            os.remove(path)
+            raise
+        os.close(fd)
+
+    @staticmethod
+    def crc32c(path):
+        """
+        computes the crc32c of a local file in the base64 encoding used by
+        google storage
+        :param path: the local file name
+        :return: str
+        """
+        return checksum.crc32c(path)
+
+    def _run_parts(self, function, items):
+        """
+        calls function(*item) for every item in the thread pool shared by
+        the slices of sliced downloads and the parts of composite uploads,
+        so that the large files of a recursive operation add at most
+        workers concurrent requests instead of workers per file
+        :param function: the function to call
+        :param items: a list of argument tuples
+        :return: the list of results in the order of the items, once all
+                 calls finished. The first exception is raised after all
+                 calls finished.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        futures = [self._executor.submit(function, *item) for item in items]
+        wait(futures)
+        return [future.result() for future in futures]
+
+    def _concurrent(self, function, items, workers=None):
+        """
+        calls function(*item) for every item in a bounded thread pool and
+        yields the results as they complete. The items are consumed lazily
+        so that at most a small multiple of workers tasks are queued.
+        :param function: the function to call, it must not raise
+        :param items: an iterable of argument tuples
+        :param workers: the number of threads, defaults to self.workers
+        :return: generator of results
+        """
+        workers = int(workers or self.workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            for item in items:
+                pending.add(executor.submit(function, *item))
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+    @staticmethod
+    def _summary(files, start):
+        """
+        aggregates the per file records of a transfer
+        :param files: the list of records returned by the transfer functions
+        :param start: the time the transfer started
+        :return: dict
+        """
+        seconds = time.time() - start
+        size = sum(f['size'] for f in files if f['status'] == 'ok')
+        return {
+            'files': files,
+            'count': len(files),
+            'failed': len([f for f in files if f['status'] == 'failed']),
+            'skipped': len([f for f in files if f['status'] == 'skipped']),
+            'retries': sum(f.get('retries', 0) for f in files),
+            'bytes': size,
+            'seconds': seconds,
+            'bytes_per_sec': size / seconds if seconds > 0 else 0,
+        }
+
+    def put(self, source=None, destination=None, recursive=None,
+            workers=None, manifest=False, compress=False, priority=None,
+            dedup=False):
         """
         Uploads(puts) the source(local) to the destination service bucket
         :param source: the source which either can be a directory or file
         :param destination: the destination which either can be a directory or file
+        :param recursive: upload all files below the source directory
+        :param workers: the number of concurrent uploads used in recursive
+                        mode, defaults to the workers option
+        :param manifest: record the digests computed during a recursive
+                         upload in the local manifest used by sync
+        :param compress: gzip compress files whose type is listed in the
+                         compress_types option while they are uploaded and
+                         store them with gzip content encoding
+        :param priority: the bandwidth priority of the transfers, lower
+                         values first. By default small files go first.
+        :param dedup: skip files whose size and crc32c, or md5 if the blob
+                      has no crc32c, equal the ones of the existing blob.
+                      The digests of the files are cached in the local
+                      manifest by path, size and mtime.
         :return: dict
 
         """
-        print(self.bucket)
+        self.storage_dict = {}
         self.storage_dict['action'] = 'put'
         self.storage_dict['source'] = source
         self.storage_dict['destination'] = destination  # dest
+
+        if source == '-':
+            return self.put_stream(sys.stdin.buffer, destination,
+                                   compress=compress, priority=priority)
+        if recursive:
+            return self._put_recursive(source, destination, workers=workers,
+                                       manifest=manifest, compress=compress,
+                                       priority=priority, dedup=dedup)
+
         try:
             print("Bucket: ",self.bucket)
             print("Source: ",source)
             print("Destination: ",destination)
-            blob = self.bucket.blob(destination)
-            blob.upload_from_filename(path_expand(source))
+            path = path_expand(source)
+            if dedup:
+                cached = Manifest(os.path.dirname(path))
+                identical = self._identical(path, self._lookup(destination),
+                                            cached)
+                cached.save(prune=False)
+                if identical:
+                    print(f'File {source} is unchanged in {destination}.')
+                    self.storage_dict['skipped'] = True
+                    self.storage_dict['message'] = "Source Unchanged"
+                    return self.storage_dict
+            info, self.storage_dict['retries'] = self._attempt(
+                None, self._send, path, destination,
+                size=os.path.getsize(path),
+                compress=compress,
+                priority=priority)
+            self.storage_dict.update(info)
             print(f'File {source} uploaded to {destination}.'.format(source, destination))
+            self.storage_dict['message'] = "Source Uploaded"
         except Exception as e:
             print('Failed to upload blob at google bucket: ' + str(e))
+            self.storage_dict['message'] = str(e)
+        return self.storage_dict
+
+    def _put_recursive(self, source, destination, workers=None,
+                       manifest=False, compress=False, priority=None,
+                       dedup=False):
+        """
+        Uploads all files below the local directory source concurrently.
+        :param source: the local directory
+        :param destination: the prefix in the bucket
+        :param workers: the number of concurrent uploads
+        :param manifest: record the digests in the local manifest
+        :param compress: gzip compress the files of compressible types
+        :param priority: the bandwidth priority of the transfers
+        :param dedup: skip files identical to the existing blobs, which are
+                      taken from a single listing of the destination prefix
+        :return: dict
+        """
+        start = time.time()
+        # files completed by an interrupted run are recorded under this key
+        run = f'putdir:{self.bucket.name}/{destination}:{path_expand(source)}'
+        manifest = Manifest(source) if manifest or dedup else None
+        try:
+            remote = None
+            if dedup:
+                prefix = self.massage_path(destination or '').rstrip('/')
+                remote = {record['name']: record for record in
+                          self._listing(f'{prefix}/' if prefix else '')}
+            files = list(self._concurrent(
+                self._upload,
+                ((path, name, run, manifest, compress, priority, remote)
+                 for path, name in self._walk(source, destination)),
+                workers=workers))
+            if manifest is not None:
+                manifest.save(prune=False)
+            self.storage_dict['message'] = "Source Uploaded"
+            self.storage_dict['objectlist'] = [f['name'] for f in files]
+            self.storage_dict.update(self._summary(files, start))
+            if self.storage_dict['failed'] == 0:
+                self.journal.clear(f'{run}:')
+        except Exception as e:
+            Console.error('Failed to upload : ' + str(e))
+            self.storage_dict['message'] = str(e)
+        return self.storage_dict
+
+    def put_stream(self, source, destination, compress=False,
+                   priority=None):
+        """
+        Uploads a stream of unknown size, e.g. the output of a database dump
+        read from a pipe, without staging it on disk. The stream is sent in
+        chunk_size chunks of a resumable upload, only the chunk in flight
+        and the one kept to resend it after an error are held in memory.
+        :param source: a readable file object, a file descriptor, an
+                       iterable of bytes or - for stdin
+        :param destination: the blob name
+        :param compress: gzip compress the stream while it is uploaded and
+                         store it with gzip content encoding
+        :param priority: the bandwidth priority of the transfer, lower
+                         values first
+        :return: dict
+        """
+        self.storage_dict = {}
+        self.storage_dict['action'] = 'put'
+        self.storage_dict['source'] = source
+        self.storage_dict['destination'] = destination
+        if source == '-':
+            source = sys.stdin.buffer
+        start = time.time()
+        try:
+            self.storage_dict.update(self._send_stream(
+                source, self.massage_path(destination), compress=compress,
+                priority=1 if priority is None else priority))
+            self.storage_dict['message'] = "Source Uploaded"
+        except Exception as e:
+            stats.record('put', time.time() - start, failed=True)
+            Console.error('Failed to upload stream : ' + str(e))
+            self.storage_dict['message'] = str(e)
+        return self.storage_dict
+
+    def _send_stream(self, source, name, compress=False, priority=1,
+                     content_type='application/octet-stream'):
+        """
+        uploads a stream of unknown size in chunk_size chunks of a resumable
+        upload
+        :param source: a readable file object, a file descriptor or an
+                       iterable of bytes
+        :param name: the blob name
+        :param compress: gzip compress the stream while it is uploaded
+        :param priority: the bandwidth priority of the transfer
+        :param content_type: the content type of the blob
+        :return: dict with size, seconds, bytes_per_sec and the digests or
+                 the compression ratio
+        """
+        start = time.time()
+        # the chunk size of a resumable upload must be a multiple of 256 KiB
+        chunk_size = max(1, self.chunk_size // 2 ** 18) * 2 ** 18
+        blob = self.bucket.blob(name, chunk_size=chunk_size)
+        # the last chunk is kept to resend it after a failed request
+        reader = counter = PipeReader(
+            source, keep=0 if compress else chunk_size)
+        if compress:
+            blob.content_encoding = 'gzip'
+            reader = PipeReader(GzipReader(counter), keep=chunk_size)
+        digest = StreamingDigest() if self.verify else None
+        stream = reader if digest is None else HashingReader(reader, digest)
+        info = {}
+        try:
+            blob.upload_from_file(ThrottledReader(stream, self.throttle,
+                                                  priority),
+                                  size=None,
+                                  content_type=content_type,
+                                  checksum=None)
+            if digest is not None:
+                verified = self._verified(digest, blob)
+                if not compress:
+                    info.update(verified)
+        finally:
+            if digest is not None:
+                digest.close()
+        self._indexed(blob)
+        seconds = time.time() - start
+        info['size'] = counter.end
+        info['seconds'] = seconds
+        info['bytes_per_sec'] = counter.end / seconds if seconds > 0 else 0
+        if compress:
+            info.update(self._compression(counter.end, reader.end, seconds))
+        stats.record('put', seconds, counter.end)
+        return info
+
+    @staticmethod
+    def _identical(path, record, manifest):
+        """
+        compares a local file with an existing blob without reading the
+        blob. Blobs stored gzip compressed are never identical, as their
+        digests are the ones of the compressed data.
+        :param path: the local file name
+        :param record: the record of the blob or None if it does not exist
+        :param manifest: the Manifest caching the digests of the file
+        :return: True if the file and the blob have the same size and crc32c
+                 or, if the blob has no crc32c, the same md5
+        """
+        if record is None or record.get('encoding') == 'gzip':
+            return False
+        if manifest.stat(path)['size'] != record['size']:
+            return False
+        if record.get('crc32c') is not None:
+            return manifest.crc32c(path) == record['crc32c']
+        if record.get('md5') is not None:
+            return manifest.md5(path) == record['md5']
+        return False
+
+    def put_packed(self, source, destination, shard_size=None,
+                   workers=None, priority=None):
+        """
+        Uploads the many small files below the local directory source as a
+        few tar shards of about shard_size bytes and a pack index with the
+        offset, length and crc32c of every member. The shards are generated
+        while they are uploaded and sent concurrently. The members are read
+        with get_packed.
+        :param source: the local directory
+        :param destination: the prefix of the pack in the bucket
+        :param shard_size: the size after which a shard is closed, defaults
+                           to the shard_size option
+        :param workers: the number of concurrent shard uploads
+        :param priority: the bandwidth priority of the transfers
+        :return: dict
+        """
+        self.storage_dict = {}
+        self.storage_dict['action'] = 'put'
+        self.storage_dict['source'] = source
+        self.storage_dict['destination'] = destination
+        start = time.time()
+        try:
+            prefix = self.massage_path(destination).rstrip('/')
+            index = PackIndex()
+
+            def groups():
+                # the tree is walked while the shards are uploaded, a shard
+                # is named when it is handed to _concurrent
+                for shard, files in enumerate(pack.shards(
+                        self._walk(source, ''),
+                        int(shard_size or self.shard_size))):
+                    index.shards.append(f'{prefix}/shard-{shard:05d}.tar')
+                    yield shard, files
+
+            def send(shard, files):
+                record = {
+                    'name': index.shards[shard],
+                    'members': len(files),
+                }
+                begin = time.time()
+                try:
+                    record.update(self._send_stream(
+                        pack.tar_stream(files, index, shard),
+                        index.shards[shard],
+                        priority=1 if priority is None else priority,
+                        content_type='application/x-tar'))
+                    record['status'] = 'ok'
+                except Exception as e:
+                    stats.record('put', time.time() - begin, failed=True)
+                    record['size'] = sum(size for _, _, size in files)
+                    record['status'] = 'failed'
+                    record['error'] = str(e)
+                record['time'] = time.time() - begin
+                return record
 
-    def list(self, source=None, dir_only=False, recursive=False):
+            files = list(self._concurrent(send, groups(), workers=workers))
+            self.storage_dict.update(self._summary(files, start))
+            self.storage_dict['objectlist'] = index.shards
+            self.storage_dict['members'] = len(index.members)
+            if self.storage_dict['failed'] == 0:
+                name = f'{prefix}/pack-index.json'
+                blob = self.bucket.blob(name)
+                blob.content_encoding = 'gzip'
+                blob.upload_from_string(index.dumps(),
+                                        content_type='application/json')
+                self._indexed(blob)
+                self._packs[(self.bucket.name, prefix)] = index
+                self.storage_dict['index'] = name
+                self.storage_dict['message'] = "Source Packed"
+            else:
+                self.storage_dict['message'] = "Source Packed with failures"
+        except Exception as e:
+            Console.error('Failed to pack : ' + str(e))
+            self.storage_dict['message'] = str(e)
+        return self.storage_dict
+
+    def _walk(self, source, destination, recursive=True):
+        """
+        lazily walks the local directory source and yields for every file
+        the local path and the blob name it is uploaded to
+        :param source: the local directory
+        :param destination: the prefix in the bucket
+        :param recursive: include the files in subdirectories
+        :return: generator of (path, blob_name)
+        """
+        directory = path_expand(source)
+        prefix = self.massage_path(destination or '').rstrip('/')
+        for root, dirs, files in os.walk(directory):
+            if recursive:
+                dirs.sort()
+            else:
+                dirs.clear()
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, directory)
+                if prefix:
+                    name = f'{prefix}/{name}'
+                yield path, self.massage_path(name)
+
+    def _upload(self, path, name, run=None, manifest=None, compress=False,
+                priority=None, remote=None):
+        """
+        uploads a single file and reports the outcome
+        :param path: the local file name
+        :param name: the blob name
+        :param run: if given, the journal key of a recursive upload. Files
+                    recorded as completed under it are skipped.
+        :param manifest: if given, the local manifest in which the digests
+                         of the file are recorded
+        :param compress: gzip compress the file if its type is compressible
+        :param priority: the bandwidth priority of the transfer
+        :param remote: if given, the records of the existing blobs by name.
+                       Files identical to their blob are skipped.
+        :return: dict with name, source, size, status, retries, time and
+                 error
+        """
+        record = {
+            'name': name,
+            'source': path,
+            'size': 0,
+        }
+        start = time.time()
+        try:
+            stat = os.stat(path)
+            record['size'] = stat.st_size
+            done = [stat.st_size, stat.st_mtime]
+            if run is not None and self.journal.get(f'{run}:{name}') == done:
+                record['status'] = 'skipped'
+            elif remote is not None \
+                    and self._identical(path, remote.get(name), manifest):
+                record['status'] = 'skipped'
+                record['unchanged'] = True
+            else:
+                info, record['retries'] = self._attempt(
+                    None, self._send, path, name,
+                    size=stat.st_size,
+                    manifest=manifest,
+                    compress=compress,
+                    priority=priority)
+                record.update(info)
+                record['status'] = 'ok'
+                if run is not None:
+                    self.journal.put(f'{run}:{name}', done)
+        except Exception as e:
+            record['status'] = 'failed'
+            record['error'] = str(e)
+        record['time'] = time.time() - start
+        return record
+
+    def list(self, source=None, dir_only=False, recursive=False,
+             page_size=None, fields=None):
         """
         Lists the source: google bucket blob(s) with and without prefix
+
+        The listing is returned as a generator and fetched page by page
+        while it is consumed. With fields only the named properties of the
+        blobs are requested from the server, which reduces the size of
+        every page considerably.
+
         :param source: the source which either can be a directory or file (either provide fill path or a prefix)
-        :return: dict
+        :param dir_only: only list the prefixes one level below source
+        :param recursive: not used, the blobs at all levels are listed
+        :param page_size: the number of blobs requested per page
+        :param fields: a comma separated list of the blob properties to
+                       return, e.g. name,size,updated. The default returns
+                       the properties kept in the local index.
+        :return: generator of dicts
 
         """
-        self.storage_dict['source'] = Provider.get_filename(source)
-        print("Bucket: ",self.bucket)
-        print("Source keyword: ",source)
+        source = Provider.get_filename(source or '')
+        self.storage_dict['action'] = 'list'
+        self.storage_dict['source'] = source
+        if fields is not None and not isinstance(fields, (list, tuple)):
+            fields = [f.strip() for f in fields.split(',')]
+
+        if dir_only:
+            return self._list_prefixes(source, page_size)
+        # the index only answers for the properties its records keep, other
+        # fields are requested from the server
+        if self.index is not None and (fields is None or {
+                self.record_keys.get(field, field) for field in fields
+        } <= set(BlobIndex.fields)):
+            return self._project(self._listing(source), fields)
+
+        if fields is None:
+            projection = self.record_fields
+        else:
+            projection = f"items({','.join(fields)}),nextPageToken"
+        blobs = self.client.list_blobs(self.bucket,
+                                       prefix=source or None,
+                                       page_size=page_size,
+                                       fields=projection)
+        if fields is None:
+            return (self._record(blob) for blob in self._items(blobs))
+        return ({field: self._property(blob, field) for field in fields}
+                for blob in self._items(blobs))
+
+    def _list_prefixes(self, source, page_size=None):
+        """
+        :param source: the prefix
+        :param page_size: the number of entries requested per page
+        :return: generator of dicts of the prefixes one level below source
+        """
+        blobs = self.client.list_blobs(self.bucket,
+                                       prefix=source or None,
+                                       delimiter='/',
+                                       page_size=page_size,
+                                       fields='prefixes,nextPageToken')
+        for page in self._pages(blobs):
+            for prefix in page.prefixes:
+                yield {'name': prefix}
+
+    @classmethod
+    def _project(cls, records, fields):
+        """
+        :param records: the records of blobs
+        :param fields: the names of the fields to keep as used by the json
+                       api or None for all
+        :return: generator of the projected records
+        """
+        for record in records:
+            if fields is None:
+                yield record
+            else:
+                yield {field: record.get(cls.record_keys.get(field, field))
+                       for field in fields}
+
+    @staticmethod
+    def _property(blob, field):
+        """
+        :param blob: a blob
+        :param field: the name of the property as used by the json api
+        :return: the value of the property, converted like the blob does
+        """
+        attributes = {
+            'size': 'size',
+            'generation': 'generation',
+            'metageneration': 'metageneration',
+            'md5Hash': 'md5_hash',
+            'contentType': 'content_type',
+            'storageClass': 'storage_class',
+        }
+        if field in attributes:
+            return getattr(blob, attributes[field])
+        if field == 'updated':
+            return blob.updated.isoformat() if blob.updated else None
+        return blob._properties.get(field)
+
+    def print_list(self, source=None, dir_only=False, recursive=False):
+        """
+        prints the names returned by list
+        :param source: the prefix
+        :param dir_only: only print the prefixes one level below source
+        :param recursive: not used, the blobs at all levels are listed
+        :return: dict
+        """
+        print("Bucket: ", self.bucket)
+        print("Source keyword: ", source)
         try:
-            blobs = self.client.list_blobs(self.bucket_name, prefix=self.storage_dict['source'])
             print('Blobs: ')
-            print(blobs)
-            for blob in blobs:
-                print(blob.name)
+            for blob in self.list(source, dir_only=dir_only,
+                                  recursive=recursive, fields='name'):
+                print(blob['name'])
         except Exception as e:
             print('Failed to list blobs from google bucket: ' + str(e))
+        return self.storage_dict
 
-    def delete(self, source=None):
+    def delete(self, source=None, workers=None):
         """
-        Deletes a blob from the bucket.
+        Deletes the blobs starting with source from the bucket. The listing
+        is streamed into json batch requests of up to 100 deletions that
+        are sent by several workers concurrently.
         :param source: Enter the blob name at google bucket you like to delete
+        :param workers: the number of concurrent batch requests
         :return: dict
 
         """
+        self.storage_dict = {}
+        self.storage_dict['action'] = 'delete'
         self.storage_dict['source'] = source
-        # print("Source=====>", source)
+        start = time.time()
         try:
-            blobs = self.bucket.list_blobs(prefix=source)
-            # print("blobs=====>",blobs )
-            for blob in blobs:
-                # print("Blobs in loop : ", blob.name)
-                blob.delete()
-                print('Blob deleted {}'.format(blob.name))
+            names = (blob['name'] for blob in self._listing(source))
+            self.storage_dict.update(self._delete_names(names, workers))
+            self.storage_dict['seconds'] = time.time() - start
         except Exception as e:
             print('Failed to delete blob at google bucket: ' + str(e))
+            self.storage_dict['message'] = str(e)
+        return self.storage_dict
+
+    def _delete_names(self, names, workers=None):
+        """
+        deletes the named blobs in concurrent json batch requests
+        :param names: an iterable of blob names
+        :param workers: the number of concurrent batch requests
+        :return: dict with the counts of deleted, not found and failed blobs
+        """
+        counts = {'deleted': 0, 'not_found': 0, 'failed': 0}
+        for result in self._concurrent(
+                self._delete_batch,
+                ((chunk,) for chunk in self._chunks(names, 100)),
+                workers=workers):
+            for key in counts:
+                counts[key] += result[key]
+        return counts
+
+    def _delete_batch(self, names):
+        """
+        deletes up to 100 blobs in a single json batch request
+        :param names: the list of blob names
+        :return: dict with the counts of deleted, not found and failed blobs
+        """
+        counts = {'deleted': 0, 'not_found': 0, 'failed': 0}
+        try:
+            responses, _ = self._attempt(
+                'delete', self._batch,
+                lambda name: self.bucket.blob(name).delete(), names)
+        except Exception as e:
+            Console.error('Failed to delete batch : ' + str(e))
+            counts['failed'] = len(names)
+            return counts
+        for name, response in responses:
+            if 200 <= response.status_code < 300:
+                counts['deleted'] += 1
+                self._unindexed(name)
+            elif response.status_code == 404:
+                counts['not_found'] += 1
+                self._unindexed(name)
+            else:
+                counts['failed'] += 1
+        return counts
+
+    def _batch(self, function, items):
+        """
+        calls function(item) for every item and sends the resulting
+        requests as a single json batch request. A failing request does not
+        raise, its status is part of the returned responses.
+        :param function: the function issuing a request, e.g. a delete
+        :param items: the list of items, at most 100
+        :return: list of (item, response)
+        """
+        from google.cloud.storage.batch import Batch
+
+        if not items:
+            return []
+        batch = Batch(self.client)
+        # the batch stack of the client is thread local
+        self.client._push_batch(batch)
+        try:
+            for item in items:
+                function(item)
+        finally:
+            self.client._pop_batch()
+        return list(zip(items, batch.finish(raise_exception=False)))
+
+    @staticmethod
+    def _chunks(items, size):
+        """
+        groups an iterable lazily into lists
+        :param items: the iterable
+        :param size: the maximal size of a list
+        :return: generator of lists
+        """
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
 
     def create_dir(self, directory=None):
         """
@@ -285,11 +2216,58 @@ class Provider(StorageABC):
             # print("Create a directory or folder in bucket ",self.bucket_name)
             blob1 = self.bucket.blob(directory)
             blob1.upload_from_string('')
+            self._indexed(blob1)
             print('directory or folder name : {} '.format(blob1.name))
         except Exception as e:
             print('Failed to create directory at google bucket: ' + str(e))
 
 
+    def blobs_metadata(self, names, workers=None):
+        """
+        Fetches the metadata of many blobs. The names are grouped into json
+        batch requests of up to 100 lookups that are sent concurrently.
+        :param names: an iterable of blob names
+        :param workers: the number of concurrent batch requests
+        :return: generator of dicts with name, size, generation, crc32c,
+                 md5, storage_class, updated and status, which is ok,
+                 not_found or failed
+        """
+        for records in self._concurrent(
+                self._metadata_batch,
+                ((chunk,) for chunk in self._chunks(names, 100)),
+                workers=workers):
+            for record in records:
+                yield record
+
+    def _metadata_batch(self, names):
+        """
+        fetches the metadata of up to 100 blobs in a json batch request
+        :param names: the list of blob names
+        :return: list of dicts
+        """
+        blobs = [self.bucket.blob(name) for name in names]
+        try:
+            responses, _ = self._attempt(
+                'metadata', self._batch, lambda blob: blob.reload(), blobs)
+        except Exception as e:
+            return [{'name': name, 'status': 'failed', 'error': str(e)}
+                    for name in names]
+        records = []
+        for blob, response in responses:
+            if 200 <= response.status_code < 300:
+                record = self._record(blob)
+                record['storage_class'] = blob.storage_class
+                record['status'] = 'ok'
+                self._indexed(blob)
+            elif response.status_code == 404:
+                record = {'name': blob.name, 'status': 'not_found'}
+                self._unindexed(blob.name)
+            else:
+                record = {'name': blob.name, 'status': 'failed',
+                          'error': f'status {response.status_code}'}
+            records.append(record)
+        return records
+
     def blob_metadata(self, blob_name=None):
         """
         Prints out a blob's metadata.
@@ -347,13 +2325,76 @@ class Provider(StorageABC):
             print("Bucket:  ", self.bucket)
             blob = self.bucket.blob(blob_name)
             # print("blob:  ", blob)
-            new_blob = self.bucket.rename_blob(blob, new_name)
+            new_blob, _ = self._attempt('rename', self.bucket.rename_blob,
+                                        blob, new_name)
+            self._unindexed(blob_name)
+            self._indexed(new_blob)
             # print("new blob:  ", new_blob)
             print('Blob {} has been renamed to {}'.format(blob.name, new_blob.name))
         except Exception as e:
             print('Failed to rename blob  : ' + str(e))
 
 
+    def rename_prefix(self, source, destination, workers=None,
+                      progress=True):
+        """
+        Renames all blobs starting with source so that they start with
+        destination. The blobs are copied on the server concurrently and a
+        source blob is deleted, in batch requests, only after its copy is
+        confirmed. A blob whose destination already exists with the same
+        size and crc32c is not copied again, so an interrupted rename can
+        simply be run again.
+        :param source: the prefix to rename, e.g. runs/2026-10-01/
+        :param destination: the new prefix
+        :param workers: the number of concurrent copies and batch requests
+        :param progress: print the progress every 1000 blobs
+        :return: dict
+        """
+        self.storage_dict = {}
+        self.storage_dict['action'] = 'rename'
+        self.storage_dict['source'] = source
+        self.storage_dict['destination'] = destination
+        start = time.time()
+        try:
+            if source.startswith(destination) \
+                    or destination.startswith(source):
+                raise ValueError(f'The prefixes {source} and {destination} '
+                                 f'must not overlap')
+            existing = {record['name']: (record['size'], record['crc32c'])
+                        for record in self._listing(destination)}
+            files = []
+
+            def rename(record, name):
+                if existing.get(name) == (record['size'], record['crc32c']):
+                    return {'name': record['name'], 'destination': name,
+                            'size': record['size'] or 0, 'status': 'skipped'}
+                return self._copy(record, self.bucket, name,
+                                  operation='rename')
+
+            def confirmed():
+                for result in self._concurrent(
+                        rename,
+                        ((record, destination + record['name'][len(source):])
+                         for record in self._listing(source)),
+                        workers=workers):
+                    files.append(result)
+                    if progress and len(files) % 1000 == 0:
+                        print(f'Renamed {len(files)} blobs')
+                    if result['status'] != 'failed':
+                        yield result['name']
+
+            deleted = self._delete_names(confirmed(), workers=workers)
+            self.storage_dict.update(self._summary(files, start))
+            self.storage_dict['deleted'] = deleted
+            if progress:
+                print(f'Renamed {len(files)} blobs, '
+                      f'{self.storage_dict["failed"]} failed')
+            self.storage_dict['message'] = "Source Renamed"
+        except Exception as e:
+            Console.error('Failed to rename : ' + str(e))
+            self.storage_dict['message'] = str(e)
+        return self.storage_dict
+
     def create_bucket(self,new_bucket_name=None):
         """
         Creates a new bucket, only used for creating new bucket
@@ -397,60 +2438,232 @@ class Provider(StorageABC):
             # source_bucket = self.bucket
             # source_bucket = self.client.get_bucket(bucket_name)
             source_blob = self.bucket.blob(blob_name)
-            destination_bucket = self.client.get_bucket(bucket_name_dest)
+            destination_bucket = self._bucket_handle(bucket_name_dest)
             dest_blob = self.bucket.copy_blob(
                 source_blob, destination_bucket, blob_name_dest)
             print(f'Source Bucket:{self.bucket} ,   destination Bucket:{destination_bucket}')
             print(f'Blob {source_blob}  copied to blob {dest_blob} .'.format(source_blob.name,  dest_blob.name))
         except Exception as e:
             print('Failed to copy blob to destination google bucket  : ' + str(e))
+        return self.storage_dict
+
+    def _bucket_handle(self, name):
+        """
+        :param name: the name of a bucket
+        :return: a cached handle of the bucket, created without a request
+        """
+        if name not in self._buckets:
+            self._buckets[name] = self.client.bucket(name)
+        return self._buckets[name]
+
+    def copy_prefix(self, source, bucket_name_dest, destination=None,
+                    workers=None):
+        """
+        Copies all blobs starting with source to another bucket with the
+        rewrite api. Large objects and copies across locations or storage
+        classes need several rewrite calls, which are continued with the
+        rewrite token. Many rewrites run concurrently. Completed copies are
+        recorded in the journal, so running an interrupted copy again only
+        copies the remaining blobs.
+        :param source: the prefix of the blobs to copy
+        :param bucket_name_dest: the name of the destination bucket
+        :param destination: the prefix replacing source in the destination
+                            names, defaults to source
+        :param workers: the number of concurrent rewrites
+        :return: dict
+        """
+        self.storage_dict = {}
+        self.storage_dict['action'] = 'copy'
+        self.storage_dict['source'] = source
+        self.storage_dict['bucket_name_dest'] = bucket_name_dest
+        self.storage_dict['destination'] = destination
+        start = time.time()
+        source = source or ''
+        destination = source if destination is None else destination
+        bucket = self._bucket_handle(bucket_name_dest)
+        run = f'copy:{self.bucket.name}/{source}:{bucket_name_dest}/{destination}'
+        try:
+            files = list(self._concurrent(
+                self._copy,
+                ((record, bucket, destination + record['name'][len(source):],
+                  run) for record in self._listing(source)),
+                workers=workers))
+            self.storage_dict.update(self._summary(files, start))
+            if self.storage_dict['failed'] == 0:
+                self.journal.clear(f'{run}:')
+            self.storage_dict['message'] = "Source Copied"
+        except Exception as e:
+            Console.error('Failed to copy : ' + str(e))
+            self.storage_dict['message'] = str(e)
+        return self.storage_dict
+
+    def _copy(self, record, bucket, name, run=None, operation='copy'):
+        """
+        copies a single blob with rewrite calls and reports the outcome
+        :param record: the record of the source blob
+        :param bucket: the destination bucket
+        :param name: the destination blob name
+        :param run: if given, the journal key under which completed copies
+                    are recorded and skipped
+        :param operation: the name under which the rewrites are recorded in
+                          the statistics
+        :return: dict with name, destination, size, rewrites, retries,
+                 status, time and error
+        """
+        result = {
+            'name': record['name'],
+            'destination': name,
+            'size': record['size'] or 0,
+            'rewrites': 0,
+        }
+        start = time.time()
+        key = f"{run}:{record['name']}"
+        try:
+            if run is not None and \
+                    self.journal.get(key) == record['generation']:
+                result['status'] = 'skipped'
+            else:
+                source = self.bucket.blob(record['name'])
+                target = bucket.blob(name)
+                token = None
+                result['retries'] = 0
+                while True:
+                    (token, done, _), retries = self._attempt(
+                        operation, target.rewrite, source, token=token)
+                    result['rewrites'] += 1
+                    result['retries'] += retries
+                    if token is None:
+                        break
+                if bucket.name == self.bucket.name:
+                    self._indexed(target)
+                if run is not None:
+                    self.journal.put(key, record['generation'])
+                result['status'] = 'ok'
+        except Exception as e:
+            result['status'] = 'failed'
+            result['error'] = str(e)
+        result['time'] = time.time() - start
+        return result
 
     def search(self, directory=None, filename=None, recursive=False):
         """
         gets the destination and copies it in source
 
+        The filename is a glob pattern matched against the blob names
+        relative to the directory. Its longest literal prefix is sent to
+        the server as listing prefix, so only the matching part of the
+        bucket is listed, and the rest of the pattern is matched on the
+        pages as they arrive. In recursive mode a pattern without a slash
+        also matches the last component of names in subdirectories. In
+        non recursive mode the names must have as many slashes as the
+        pattern, so b/*.txt matches the files directly below b.
+
         :param service: the name of the service in the yaml file
         :param directory: the directory which either can be a directory or file
         :param filename: filename
         :param recursive: in case of directory the recursive refers to all
                           subdirectories in the specified source
-        :return: dict
+        :return: generator of dicts of the matching blobs
         """
-        raise NotImplementedError
+        directory = self.massage_path(directory or '').strip('/')
+        directory = f'{directory}/' if directory else ''
+        pattern = filename or '*'
+        literal = re.split(r'[*?\[]', pattern, maxsplit=1)[0]
+        if recursive and '/' not in pattern:
+            prefix = directory
+        else:
+            prefix = directory + literal
 
-    def sync(self, source=None, destination=None, recursive=None ):
+        depth = pattern.count('/')
+
+        def matches(name):
+            relative = name[len(directory):]
+            if not recursive:
+                return relative.count('/') == depth and \
+                    fnmatch.fnmatchcase(relative, pattern)
+            if '/' not in pattern:
+                relative = relative.rsplit('/', 1)[-1]
+            return fnmatch.fnmatchcase(relative, pattern)
+
+        if self.index is not None:
+            for record in self._listing(prefix):
+                if matches(record['name']):
+                    yield record
+            return
+
+        # the delimiter only lists the level of the prefix, which holds all
+        # matches unless the pattern has a slash after its literal prefix
+        flat = not recursive and '/' not in pattern[len(literal):]
+        blobs = self.client.list_blobs(
+            self.bucket,
+            prefix=prefix or None,
+            delimiter='/' if flat else None,
+            fields=self.record_fields)
+        for page in self._pages(blobs):
+            for blob in page:
+                if matches(blob.name):
+                    yield self._record(blob)
+
+    def sync(self, source=None, destination=None, recursive=True,
+             delete=False, workers=None):
         """
         sync the destination and local
 
+        Only files that are new or differ in size or crc32c from the blobs
+        below the destination prefix are uploaded. The local manifest is
+        cached, so the crc32c of a file is only computed again when its
+        size or mtime changed.
+
         :param source:  local computer location
         :param destination: cloud service
         :param recursive: in case of directory the recursive refers to all
                           subdirectories in the specified source
+        :param delete: delete blobs below the destination prefix that do not
+                       exist locally
+        :param workers: the number of concurrent transfers
         :return: dict
         """
-        raise NotImplementedError
+        self.storage_dict = {}
+        self.storage_dict['action'] = 'sync'
+        self.storage_dict['source'] = source
+        self.storage_dict['destination'] = destination
+        start = time.time()
+        try:
+            manifest = Manifest(source)
+            prefix = self.massage_path(destination or '').rstrip('/')
+            remote = {}
+            for blob in self._items(self.client.list_blobs(
+                    self.bucket,
+                    prefix=f'{prefix}/' if prefix else None,
+                    delimiter=None if recursive else '/',
+                    fields='items(name,size,crc32c),nextPageToken')):
+                if not blob.name.endswith('/'):
+                    remote[blob.name] = (blob.size, blob.crc32c)
 
-   # def bucket_exists(self, name=None):
-    #      bucket = gcp.get_bucket(name)
-    #
-    #      if bucket == bucket_name:
-    #         return  True
-    #      else:
-    #          return False
-    #
-    #
-    # def bucket_create(self, name=None):
-    #
-    #     #bucket_name = 'my-new-bucket_shre2'
-    #     Creates the new bucket
-    #     bucket = storage_client.create_bucket(bucket_name)
-    #     print("Bucket Created:", bucket_name)
-    #     return True
-    #
-    #
-    #
-    #
-    #
+            def changed():
+                for path, name in self._walk(source, destination,
+                                             recursive=recursive):
+                    entry = manifest.stat(path)
+                    existing = remote.pop(name, None)
+                    if existing is None \
+                            or existing[0] != entry['size'] \
+                            or existing[1] != manifest.crc32c(path):
+                        yield path, name, None, manifest
+
+            files = list(self._concurrent(self._upload, changed(),
+                                          workers=workers))
+            manifest.save()
+            self.storage_dict.update(self._summary(files, start))
+            self.storage_dict['objectlist'] = [f['name'] for f in files]
+            self.storage_dict['extraneous'] = sorted(remote)
+            if delete:
+                self.storage_dict['deleted'] = self._delete_names(
+                    remote, workers=workers)
+            self.storage_dict['message'] = "Source Synchronized"
+        except Exception as e:
+            Console.error('Failed to sync : ' + str(e))
+            self.storage_dict['message'] = str(e)
+        return self.storage_dict
 
     # Copied method from aws provider
     def massage_path(self, file_name_path):
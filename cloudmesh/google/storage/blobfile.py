@@ -0,0 +1,174 @@
+import collections
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BlobFile(io.RawIOBase):
+    """
+    A read only, seekable file object over a blob backed by byte range
+    requests. The blob is read in blocks of block_size bytes that are kept
+    in a least recently used cache of cache_blocks blocks, so readers that
+    jump around, e.g. to the footer of a parquet file or the central
+    directory of a zip file, only fetch the blocks they touch. Once the
+    blocks are read sequentially the next readahead bytes are fetched
+    concurrently in the background.
+    """
+
+    def __init__(self, fetch, name, size, block_size=2 ** 20,
+                 readahead=8 * 2 ** 20, cache_blocks=64, workers=4):
+        """
+        :param fetch: a function fetch(start, end) returning the bytes of
+                      the blob from start to end inclusive
+        :param name: the name of the blob
+        :param size: the size of the blob
+        :param block_size: the size of the blocks
+        :param readahead: the bytes fetched ahead of sequential reads, 0
+                          disables the readahead
+        :param cache_blocks: the number of blocks kept in the cache
+        :param workers: the number of concurrent prefetch requests
+        """
+        super().__init__()
+        self.fetch = fetch
+        self.name = name
+        self.size = size
+        self.block_size = block_size
+        self.readahead = -(-readahead // block_size)
+        # the blocks prefetched and the one being read must fit the cache
+        self.cache_blocks = max(cache_blocks, self.readahead + 1)
+        self.position = 0
+        self.lock = threading.Lock()
+        self.blocks = collections.OrderedDict()
+        self.pending = {}
+        self.last = None
+        self.executor = ThreadPoolExecutor(max_workers=workers) \
+            if self.readahead else None
+        self.requests = 0
+        self.bytes_fetched = 0
+        self.hits = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f'Invalid whence {whence}')
+        if position < 0:
+            raise ValueError(f'Negative seek position {position}')
+        self.position = position
+        return position
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def read(self, size=-1):
+        if self.closed:
+            raise ValueError('I/O operation on closed file')
+        end = self.size if size is None or size < 0 \
+            else min(self.size, self.position + size)
+        parts = []
+        while self.position < end:
+            index = self.position // self.block_size
+            block = self._block(index)
+            start = self.position - index * self.block_size
+            part = block[start:start + end - self.position]
+            parts.append(part)
+            self.position += len(part)
+        return b''.join(parts)
+
+    def readall(self):
+        return self.read()
+
+    def _fetch(self, index):
+        start = index * self.block_size
+        end = min(self.size, start + self.block_size) - 1
+        data = self.fetch(start, end)
+        with self.lock:
+            self.requests += 1
+            self.bytes_fetched += len(data)
+        return data
+
+    def _block(self, index):
+        """
+        :param index: the number of the block
+        :return: the bytes of the block from the cache, a prefetch or a new
+                 range request
+        """
+        with self.lock:
+            block = self.blocks.get(index)
+            if block is not None:
+                self.blocks.move_to_end(index)
+                self.hits += 1
+            future = self.pending.pop(index, None)
+        if block is None:
+            block = self._fetch(index) if future is None else future.result()
+            with self.lock:
+                self._cache(index, block)
+        if self.executor is not None and self.last is not None \
+                and index == self.last + 1:
+            self._prefetch(index + 1)
+        self.last = index
+        return block
+
+    def _cache(self, index, block):
+        # adds a block and evicts the least recently used ones, the lock
+        # must be held
+        self.blocks[index] = block
+        self.blocks.move_to_end(index)
+        while len(self.blocks) > self.cache_blocks:
+            self.blocks.popitem(last=False)
+
+    def _prefetch(self, first):
+        # fetches the blocks of the readahead window that are neither cached
+        # nor requested yet
+        blocks = -(-self.size // self.block_size)
+        window = range(first, min(blocks, first + self.readahead))
+        with self.lock:
+            # prefetches of an earlier window are dropped after a seek,
+            # the completed ones are kept in the cache
+            for index in [i for i in self.pending if i not in window]:
+                future = self.pending.pop(index)
+                if not future.cancel() and future.done() \
+                        and future.exception() is None:
+                    self._cache(index, future.result())
+            for index in window:
+                if index not in self.blocks and index not in self.pending:
+                    self.pending[index] = self.executor.submit(
+                        self._fetch, index)
+
+    def close(self):
+        if not self.closed and self.executor is not None:
+            for future in self.pending.values():
+                future.cancel()
+            self.executor.shutdown(wait=False)
+        self.blocks.clear()
+        self.pending.clear()
+        super().close()
+
+    def summary(self):
+        """
+        :return: dict with the number of range requests, the bytes fetched
+                 and the reads served from the cache
+        """
+        with self.lock:
+            return {
+                'name': self.name,
+                'size': self.size,
+                'requests': self.requests,
+                'bytes_fetched': self.bytes_fetched,
+                'hits': self.hits,
+            }
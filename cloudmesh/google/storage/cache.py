@@ -0,0 +1,160 @@
+import hashlib
+import os
+import shutil
+import stat
+import threading
+
+from cloudmesh.common.util import path_expand
+
+
+class BlobCache(object):
+    """
+    A local read through cache of downloaded blobs. Entries are keyed by
+    bucket, name and generation, so a blob that was overwritten is never
+    served from the cache and its old generations age out. The least
+    recently used entries are evicted when the cache grows beyond
+    max_bytes; the modification time of an entry records its last use, so
+    several processes can share the directory.
+
+    Downloaded files are copied into the cache, so they stay writable. The
+    entries are read only and are copied to the destination on a hit, or
+    handed out as hard links if link is set and the cache and the
+    destination are on the same file system. Linked destinations share
+    the read only entry, so changing them in place can not change the
+    cache; they have to be removed before they are written.
+    """
+
+    def __init__(self, directory="~/.cloudmesh/google-storage-cache",
+                 max_bytes=10 * 2 ** 30, link=False):
+        """
+        :param directory: the cache directory
+        :param max_bytes: the maximal size of all entries
+        :param link: hand out entries as read only hard links where
+                     possible instead of copies
+        """
+        self.directory = path_expand(directory)
+        self.max_bytes = max_bytes
+        self.link = link
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self.bytes = sum(size for _, _, size in self._entries())
+
+    def key(self, bucket, name, generation, raw=False):
+        """
+        :param bucket: the bucket name
+        :param name: the blob name
+        :param generation: the generation of the blob
+        :param raw: True if the blob is kept gzip compressed as stored
+        :return: the path of the entry
+        """
+        digest = hashlib.sha1(f'{bucket}/{name}'.encode('utf-8')).hexdigest()
+        suffix = '.gz' if raw else ''
+        return os.path.join(self.directory, digest[:2],
+                            f'{digest}-{generation}{suffix}')
+
+    def fetch(self, key, path):
+        """
+        places the entry at path if it is cached
+        :param key: the path of the entry as returned by key
+        :param path: the destination file
+        :return: True on a hit
+        """
+        try:
+            size = os.path.getsize(key)
+            self._place(key, path)
+            os.utime(key)
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+            return False
+        with self.lock:
+            self.hits += 1
+            self.bytes_saved += size
+        return True
+
+    def store(self, key, path):
+        """
+        adds the downloaded file path to the cache and evicts the least
+        recently used entries if the cache is too large
+        :param key: the path of the entry as returned by key
+        :param path: the downloaded file
+        """
+        os.makedirs(os.path.dirname(key), exist_ok=True)
+        tmp = f'{key}.{os.getpid()}.{threading.get_ident()}.tmp'
+        shutil.copyfile(path, tmp)
+        os.chmod(tmp, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        os.replace(tmp, key)
+        with self.lock:
+            self.bytes += os.path.getsize(key)
+            if self.bytes > self.max_bytes:
+                self._evict()
+
+    def _place(self, source, destination):
+        # replaces destination by a hard link to or a copy of source
+        if os.path.lexists(destination):
+            os.remove(destination)
+        if self.link:
+            try:
+                os.link(source, destination)
+                return
+            except OSError:
+                pass
+        shutil.copyfile(source, destination)
+
+    def _entries(self):
+        # the path, last use and size of every entry
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                if filename.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    s = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, s.st_mtime, s.st_size
+
+    def _evict(self):
+        # removes the least recently used entries until the cache uses at
+        # most 90% of max_bytes, entries of other processes are counted too
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        self.bytes = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if self.bytes <= 0.9 * self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.bytes -= size
+
+    def clear(self):
+        """
+        removes all entries
+        """
+        with self.lock:
+            for path, _, _ in list(self._entries()):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self.bytes = 0
+
+    def summary(self):
+        """
+        :return: dict with the hits, misses, hit ratio and bytes saved of
+                 this process and the size of the cache
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'bytes_saved': self.bytes_saved,
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+            }
@@ -0,0 +1,169 @@
+import base64
+import hashlib
+import queue
+import threading
+
+
+def encode(digest):
+    """
+    encodes a binary digest the way google storage reports crc32c and md5
+    values
+    :param digest: the digest as bytes
+    :return: str
+    """
+    return base64.b64encode(digest).decode('utf-8')
+
+
+def crc32c(path):
+    """
+    computes the crc32c of a local file
+    :param path: the local file name
+    :return: the base64 encoded crc32c
+    """
+    import google_crc32c
+
+    checksum = google_crc32c.Checksum()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(2 ** 20), b''):
+            checksum.update(chunk)
+    return encode(checksum.digest())
+
+
+# the reflected crc32c (Castagnoli) polynomial
+_POLY = 0x82F63B78
+
+
+def _multiply(a, b):
+    # a * b modulo the polynomial, both in the reflected bit order
+    m = 1 << 31
+    p = 0
+    while True:
+        if a & m:
+            p ^= b
+            if a & (m - 1) == 0:
+                break
+        m >>= 1
+        b = (b >> 1) ^ _POLY if b & 1 else b >> 1
+    return p
+
+
+# x^(2^n) modulo the polynomial
+_X2N = [1 << 30]
+for _ in range(31):
+    _X2N.append(_multiply(_X2N[-1], _X2N[-1]))
+
+
+def crc32c_combine(crc1, crc2, length):
+    """
+    computes the crc32c of the concatenation of two byte strings from the
+    crc32c of each of them, so that slices hashed separately and out of
+    order can be verified without reading the data again
+    :param crc1: the crc32c of the first bytes as int
+    :param crc2: the crc32c of the second bytes as int
+    :param length: the length of the second bytes
+    :return: the crc32c of both as int
+    """
+    # crc1 is shifted by length zero bytes, i.e. multiplied by x^(8 length)
+    p = 1 << 31
+    k = 3
+    while length:
+        if length & 1:
+            p = _multiply(_X2N[k & 31], p)
+        length >>= 1
+        k += 1
+    return _multiply(p, crc1) ^ crc2
+
+
+def md5(path):
+    """
+    computes the md5 of a local file
+    :param path: the local file name
+    :return: the base64 encoded md5
+    """
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(2 ** 20), b''):
+            digest.update(chunk)
+    return encode(digest.digest())
+
+
+class StreamingDigest(object):
+    """
+    Computes the crc32c and md5 of a stream of chunks on a background
+    thread, so that hashing does not slow down the thread moving the data.
+    The chunks are handed over through a bounded queue.
+    """
+
+    def __init__(self, maxsize=16):
+        """
+        :param maxsize: the number of chunks that may wait for hashing
+        """
+        import google_crc32c
+
+        self.crc32c = google_crc32c.Checksum()
+        self.md5 = hashlib.md5()
+        self.queue = queue.Queue(maxsize)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.result = None
+
+    def _run(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            self.crc32c.update(data)
+            self.md5.update(data)
+
+    def update(self, data):
+        """
+        adds a chunk to the digest
+        :param data: the bytes of the chunk
+        """
+        self.queue.put(bytes(data))
+
+    def finish(self):
+        """
+        waits until all chunks are hashed
+        :return: dict with the base64 encoded crc32c and md5
+        """
+        if self.result is None:
+            self.queue.put(None)
+            self.thread.join()
+            self.result = {
+                'crc32c': encode(self.crc32c.digest()),
+                'md5': encode(self.md5.digest()),
+            }
+        return self.result
+
+    def verify(self, name, crc32c=None, md5=None):
+        """
+        compares the digest with the checksums reported by google storage.
+        Composite objects have no md5, so the crc32c is preferred.
+        :param name: the name of the object used in the error message
+        :param crc32c: the crc32c of the object
+        :param md5: the md5 of the object
+        :return: dict with the digest
+        """
+        result = self.finish()
+        if crc32c is not None and crc32c != result['crc32c']:
+            raise ValueError(f'crc32c mismatch for {name}')
+        if crc32c is None and md5 is not None and md5 != result['md5']:
+            raise ValueError(f'md5 mismatch for {name}')
+        return result
+
+    def close(self):
+        """
+        stops the hashing thread without waiting for a result, e.g. after a
+        failed transfer. The thread stops after the chunks already queued.
+        """
+        if self.result is None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
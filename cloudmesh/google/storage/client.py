@@ -0,0 +1,57 @@
+import threading
+
+_lock = threading.Lock()
+_clients = {}
+
+
+def get_client(path, project=None, pool_size=10):
+    """
+    returns the storage client for a service account json file. The
+    clients are cached for the process and keyed by the file and project,
+    so all providers using the same credentials share one authorized
+    session and reuse its connections. The connection pool of the session
+    is grown to pool_size if a provider needs more concurrent connections
+    than the cached client offers.
+
+    :param path: the service account json file
+    :param project: the project, defaults to the one in the credentials
+    :param pool_size: the number of connections kept per host
+    :return: the google.cloud.storage.Client
+    """
+    from google.auth.transport.requests import AuthorizedSession
+    from google.cloud import storage
+    from google.oauth2 import service_account
+    from requests.adapters import HTTPAdapter
+
+    key = (path, project)
+    with _lock:
+        entry = _clients.get(key)
+        if entry is None:
+            credentials = service_account.Credentials.from_service_account_file(
+                path, scopes=storage.Client.SCOPE)
+            session = AuthorizedSession(credentials)
+            client = storage.Client(
+                project=project or credentials.project_id,
+                credentials=credentials,
+                _http=session)
+            entry = _clients[key] = {
+                'client': client,
+                'session': session,
+                'pool_size': 0
+            }
+        if pool_size > entry['pool_size']:
+            adapter = HTTPAdapter(pool_connections=pool_size,
+                                  pool_maxsize=pool_size)
+            entry['session'].mount('https://', adapter)
+            entry['pool_size'] = pool_size
+        return entry['client']
+
+
+def clear_clients():
+    """
+    removes all cached clients and closes their sessions
+    """
+    with _lock:
+        for entry in _clients.values():
+            entry['session'].close()
+        _clients.clear()
@@ -0,0 +1,190 @@
+import os
+import sqlite3
+import threading
+import time
+
+from cloudmesh.common.util import path_expand
+
+
+class BlobIndex(object):
+    """
+    A local sqlite index of bucket listings. It keeps name, size,
+    generation, crc32c, md5, content encoding and the update time of every
+    blob, so that
+    prefix listings, existence checks and size queries are answered without
+    listing the bucket. A prefix is refreshed by streaming its listing into
+    the index and removing the rows that were not seen. Operations that
+    change the bucket update the rows in place.
+    """
+
+    fields = ['name', 'size', 'generation', 'crc32c', 'md5', 'updated',
+              'encoding']
+
+    def __init__(self, filename="~/.cloudmesh/google-storage-index.db"):
+        """
+        :param filename: the location of the sqlite database
+        """
+        self.path = path_expand(filename)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                " bucket TEXT, name TEXT, size INTEGER, generation INTEGER,"
+                " crc32c TEXT, md5 TEXT, updated TEXT, refresh REAL,"
+                " encoding TEXT, PRIMARY KEY (bucket, name))")
+            columns = [row[1] for row in
+                       self.db.execute("PRAGMA table_info(blobs)")]
+            if 'encoding' not in columns:
+                # indexes created before the encoding was recorded
+                self.db.execute("ALTER TABLE blobs ADD COLUMN encoding TEXT")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS refreshes ("
+                " bucket TEXT, prefix TEXT, time REAL,"
+                " PRIMARY KEY (bucket, prefix))")
+
+    @staticmethod
+    def _range(prefix):
+        # the names starting with prefix, expressed so that sqlite can use
+        # the primary key
+        return prefix, prefix + "\U0010ffff"
+
+    def refresh(self, bucket, records, prefix="", batch=1000):
+        """
+        replaces the rows below prefix with the records of a listing
+        :param bucket: the bucket name
+        :param records: an iterable of dicts with the keys in fields
+        :param prefix: the prefix the listing was made for
+        :param batch: the number of rows written per transaction
+        :return: the number of records
+        """
+        marker = time.time()
+        count = 0
+        rows = []
+        for record in records:
+            rows.append(self._row(bucket, record, marker))
+            count += 1
+            if len(rows) >= batch:
+                self._write(rows)
+                rows = []
+        self._write(rows)
+        low, high = self._range(prefix)
+        with self.lock, self.db:
+            self.db.execute(
+                "DELETE FROM blobs WHERE bucket = ? AND name >= ?"
+                " AND name < ? AND refresh < ?", (bucket, low, high, marker))
+            self.db.execute(
+                "DELETE FROM refreshes WHERE bucket = ? AND prefix >= ?"
+                " AND prefix < ?", (bucket, low, high))
+            self.db.execute("INSERT INTO refreshes VALUES (?, ?, ?)",
+                            (bucket, prefix, marker))
+        return count
+
+    def fresh(self, bucket, prefix="", max_age=None):
+        """
+        :param bucket: the bucket name
+        :param prefix: the prefix
+        :param max_age: the maximal age of the refresh in seconds, None
+                        accepts any age
+        :return: True if the prefix or a prefix covering it was refreshed
+        """
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT prefix, time FROM refreshes WHERE bucket = ?",
+                (bucket,)).fetchall()
+        now = time.time()
+        for covering, refreshed in rows:
+            if prefix.startswith(covering) and \
+                    (max_age is None or now - refreshed <= max_age):
+                return True
+        return False
+
+    def invalidate(self, bucket, prefix=""):
+        """
+        forgets the rows and refreshes below prefix
+        :param bucket: the bucket name
+        :param prefix: the prefix
+        """
+        low, high = self._range(prefix)
+        with self.lock, self.db:
+            self.db.execute(
+                "DELETE FROM blobs WHERE bucket = ? AND name >= ?"
+                " AND name < ?", (bucket, low, high))
+            # refreshes below the prefix and the ones covering it are stale
+            refreshes = self.db.execute(
+                "SELECT prefix FROM refreshes WHERE bucket = ?",
+                (bucket,)).fetchall()
+            self.db.executemany(
+                "DELETE FROM refreshes WHERE bucket = ? AND prefix = ?",
+                [(bucket, p) for p, in refreshes
+                 if p.startswith(prefix) or prefix.startswith(p)])
+
+    def list(self, bucket, prefix="", page_size=1000):
+        """
+        :param bucket: the bucket name
+        :param prefix: the prefix
+        :param page_size: the number of rows read at a time
+        :return: generator of dicts for the blobs below prefix, read page by
+                 page while it is consumed
+        """
+        low, high = self._range(prefix)
+        # the first page includes low, the later ones start after the last
+        # name of the previous page
+        condition = "name >= ?"
+        while True:
+            with self.lock:
+                rows = self.db.execute(
+                    f"SELECT {', '.join(self.fields)} FROM blobs"
+                    f" WHERE bucket = ? AND {condition} AND name < ?"
+                    " ORDER BY name LIMIT ?",
+                    (bucket, low, high, page_size)).fetchall()
+            for row in rows:
+                yield dict(zip(self.fields, row))
+            if len(rows) < page_size:
+                return
+            condition = "name > ?"
+            low = rows[-1][0]
+
+    def get(self, bucket, name):
+        """
+        :param bucket: the bucket name
+        :param name: the blob name
+        :return: the dict of the blob or None
+        """
+        with self.lock:
+            row = self.db.execute(
+                f"SELECT {', '.join(self.fields)} FROM blobs"
+                " WHERE bucket = ? AND name = ?", (bucket, name)).fetchone()
+        return None if row is None else dict(zip(self.fields, row))
+
+    def put(self, bucket, record):
+        """
+        adds or updates the row of a blob
+        :param bucket: the bucket name
+        :param record: a dict with the keys in fields
+        """
+        self._write([self._row(bucket, record, time.time())])
+
+    def remove(self, bucket, name):
+        """
+        removes the row of a blob
+        :param bucket: the bucket name
+        :param name: the blob name
+        """
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM blobs WHERE bucket = ? AND name = ?",
+                            (bucket, name))
+
+    def _row(self, bucket, record, marker):
+        return (bucket,) + tuple(record.get(f) for f in self.fields) + (marker,)
+
+    def _write(self, rows):
+        if rows:
+            columns = ', '.join(['bucket'] + self.fields + ['refresh'])
+            with self.lock, self.db:
+                self.db.executemany(
+                    f"INSERT OR REPLACE INTO blobs ({columns})"
+                    f" VALUES ({', '.join(['?'] * (len(self.fields) + 2))})",
+                    rows)
@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+
+from cloudmesh.common.util import path_expand
+
+
+class Journal(object):
+    """
+    A small append only journal that keeps the state of transfers across
+    runs, e.g. the session uri and confirmed offset of a resumable upload or
+    the files completed by a recursive upload. Every change is appended as a
+    json line, so an interrupted process loses at most the last change. The
+    file is compacted when it is loaded and mostly contains stale lines.
+    """
+
+    def __init__(self, filename="~/.cloudmesh/google-storage-journal.jsonl"):
+        """
+        :param filename: the location of the journal
+        """
+        self.path = path_expand(filename)
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.load()
+
+    def load(self):
+        """
+        reads the journal from disk
+        """
+        self.entries = {}
+        lines = 0
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        change = json.loads(line)
+                    except ValueError:
+                        # a line cut short by an interrupted write
+                        continue
+                    if change["value"] is None:
+                        self.entries.pop(change["key"], None)
+                    else:
+                        self.entries[change["key"]] = change["value"]
+        if lines > 2 * len(self.entries) + 1000:
+            self.compact()
+
+    def get(self, key, default=None):
+        """
+        :param key: the key
+        :param default: returned if the key is not in the journal
+        :return: the value stored under the key
+        """
+        with self.lock:
+            return self.entries.get(key, default)
+
+    def put(self, key, value):
+        """
+        stores the value under the key
+        :param key: the key
+        :param value: a json serializable value
+        """
+        with self.lock:
+            self.entries[key] = value
+            self._append(key, value)
+
+    def remove(self, key):
+        """
+        removes the key from the journal
+        :param key: the key
+        """
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self._append(key, None)
+
+    def clear(self, prefix):
+        """
+        removes all keys starting with prefix and compacts the journal
+        :param prefix: the prefix of the keys
+        """
+        with self.lock:
+            for key in [k for k in self.entries if k.startswith(prefix)]:
+                del self.entries[key]
+        self.compact()
+
+    def compact(self):
+        """
+        rewrites the journal so that it only contains the current entries
+        """
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                for key, value in self.entries.items():
+                    f.write(json.dumps({"key": key, "value": value}) + "\n")
+            os.replace(tmp, self.path)
+
+    def _append(self, key, value):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"key": key, "value": value}) + "\n")
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import threading
+
+from cloudmesh.common.util import path_expand
+from cloudmesh.google.storage import checksum
+
+
+class Manifest(object):
+    """
+    A cached manifest of the files in a local directory. For every file it
+    keeps size, mtime, the crc32c and the md5. The digests are only computed
+    when they are asked for and are kept as long as size and mtime of the
+    file do not change, so that comparing an unchanged tree with a bucket
+    does not read the files again.
+    """
+
+    def __init__(self, directory, cache="~/.cloudmesh/google-storage-manifest"):
+        """
+        :param directory: the local directory
+        :param cache: the directory in which manifests are cached
+        """
+        self.directory = path_expand(directory)
+        name = hashlib.sha1(self.directory.encode('utf-8')).hexdigest()
+        self.path = os.path.join(path_expand(cache), f"{name}.json")
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.seen = set()
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    self.entries = json.load(f)["files"]
+            except (ValueError, KeyError):
+                self.entries = {}
+
+    def stat(self, path):
+        """
+        updates the entry of a file with its current size and mtime. The
+        digests of the entry are dropped if the file changed.
+        :param path: the local file name
+        :return: the entry as dict
+        """
+        stat = os.stat(path)
+        with self.lock:
+            self.seen.add(path)
+            entry = self.entries.get(path)
+            if entry is None \
+                    or entry['size'] != stat.st_size \
+                    or entry['mtime'] != stat.st_mtime:
+                entry = {'size': stat.st_size, 'mtime': stat.st_mtime}
+                self.entries[path] = entry
+            return entry
+
+    def crc32c(self, path):
+        """
+        :param path: the local file name
+        :return: the crc32c of the file, computed if it is not cached
+        """
+        entry = self.stat(path)
+        if entry.get('crc32c') is None:
+            value = checksum.crc32c(path)
+            self.set(path, crc32c=value)
+            return value
+        return entry['crc32c']
+
+    def md5(self, path):
+        """
+        :param path: the local file name
+        :return: the md5 of the file, computed if it is not cached
+        """
+        entry = self.stat(path)
+        if entry.get('md5') is None:
+            value = checksum.md5(path)
+            self.set(path, md5=value)
+            return value
+        return entry['md5']
+
+    def set(self, path, **values):
+        """
+        records values such as digests in the entry of a file
+        :param path: the local file name
+        :param values: the values to record
+        """
+        with self.lock:
+            self.entries.setdefault(path, {}).update(values)
+
+    def save(self, prune=True):
+        """
+        writes the manifest to the cache
+        :param prune: drop the entries of files that were not looked at
+        """
+        with self.lock:
+            if prune:
+                self.entries = {path: entry
+                                for path, entry in self.entries.items()
+                                if path in self.seen}
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"directory": self.directory,
+                           "files": self.entries}, f)
+            os.replace(tmp, self.path)
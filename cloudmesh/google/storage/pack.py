@@ -0,0 +1,142 @@
+import gzip
+import json
+import os
+import tarfile
+
+from cloudmesh.google.storage import checksum
+
+
+class PackIndex(object):
+    """
+    The index of a pack of small files stored as tar shards. For every
+    member it keeps the shard, the offset and length of the member data in
+    the shard and its crc32c, so that a single member is read with one byte
+    range request. The index is stored gzip compressed as json with one
+    list per member to keep it small for millions of members.
+    """
+
+    version = 1
+
+    def __init__(self):
+        self.shards = []
+        self.members = {}
+
+    def add(self, name, shard, offset, length, crc32c):
+        """
+        records a member
+        :param name: the member name
+        :param shard: the number of the shard
+        :param offset: the offset of the member data in the shard
+        :param length: the length of the member data
+        :param crc32c: the base64 encoded crc32c of the member data
+        """
+        self.members[name] = [shard, offset, length, crc32c]
+
+    def get(self, name):
+        """
+        :param name: the member name
+        :return: dict with shard, offset, length and crc32c or None
+        """
+        entry = self.members.get(name)
+        if entry is None:
+            return None
+        shard, offset, length, crc32c = entry
+        return {
+            'shard': self.shards[shard],
+            'offset': offset,
+            'length': length,
+            'crc32c': crc32c,
+        }
+
+    def dumps(self):
+        """
+        :return: the gzip compressed json of the index
+        """
+        return gzip.compress(json.dumps({
+            'version': self.version,
+            'shards': self.shards,
+            'members': [[name] + entry
+                        for name, entry in self.members.items()],
+        }, separators=(',', ':')).encode('utf-8'))
+
+    @classmethod
+    def loads(cls, data):
+        """
+        :param data: the gzip compressed or plain json of an index
+        :return: PackIndex
+        """
+        if data[:2] == b'\x1f\x8b':
+            data = gzip.decompress(data)
+        content = json.loads(data.decode('utf-8'))
+        if content.get('version') != cls.version:
+            raise ValueError(f"Unsupported pack index version "
+                             f"{content.get('version')}")
+        index = cls()
+        index.shards = content['shards']
+        index.members = {entry[0]: entry[1:] for entry in content['members']}
+        return index
+
+
+def shards(files, shard_size):
+    """
+    groups files into shards of about shard_size bytes
+    :param files: an iterable of (path, member name)
+    :param shard_size: the size after which a shard is closed
+    :return: generator of lists of (path, member name, size)
+    """
+    shard = []
+    size = 0
+    for path, name in files:
+        length = os.path.getsize(path)
+        shard.append((path, name, length))
+        size += length
+        if size >= shard_size:
+            yield shard
+            shard = []
+            size = 0
+    if shard:
+        yield shard
+
+
+def tar_stream(files, index, shard, chunk_size=2 ** 20):
+    """
+    generates a tar archive of files without staging it and records the
+    offset, length and crc32c of every member in the index while the
+    archive is generated
+    :param files: a list of (path, member name, size)
+    :param index: the PackIndex
+    :param shard: the number of the shard in the index
+    :param chunk_size: the size of the chunks read from the files
+    :return: generator of bytes
+    """
+    import google_crc32c
+
+    offset = 0
+    for path, name, size in files:
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mode = 0o644
+        info.mtime = int(os.path.getmtime(path))
+        header = info.tobuf(format=tarfile.PAX_FORMAT)
+        yield header
+        offset += len(header)
+        digest = google_crc32c.Checksum()
+        length = 0
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                length += len(chunk)
+                if length > size:
+                    break
+                digest.update(chunk)
+                yield chunk
+        if length != size:
+            raise ValueError(f'{path} changed while it was packed')
+        index.add(name, shard, offset, size,
+                  checksum.encode(digest.digest()))
+        padding = -size % tarfile.BLOCKSIZE
+        yield tarfile.NUL * padding
+        offset += size + padding
+    # the end of archive marker, padded to a full record
+    end = 2 * tarfile.BLOCKSIZE
+    end += -(offset + end) % tarfile.RECORDSIZE
+    yield tarfile.NUL * end
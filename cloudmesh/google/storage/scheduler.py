@@ -0,0 +1,98 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+    A token bucket limiting the bytes per second moved by all transfers
+    sharing it. Threads waiting for tokens are served in the order of their
+    priority, lower values first, so small latency sensitive transfers are
+    not starved by bulk transfers. The rate can be changed at any time;
+    None disables the limit.
+    """
+
+    def __init__(self, rate=None, burst=None):
+        """
+        :param rate: the bytes per second or None for no limit
+        :param burst: the maximal number of tokens that can accumulate,
+                      defaults to one second worth of tokens
+        """
+        self.condition = threading.Condition()
+        self.waiting = []
+        self.counter = itertools.count()
+        self._rate = rate
+        self.burst = burst
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+
+    @property
+    def capacity(self):
+        if self._rate is None:
+            return 0
+        return max(1, int(self.burst or self._rate))
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate):
+        with self.condition:
+            self._refill()
+            self._rate = rate
+            self.tokens = min(self.tokens, self.capacity)
+            self.condition.notify_all()
+
+    def _refill(self):
+        now = time.monotonic()
+        if self._rate is not None:
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.last) * self._rate)
+        self.last = now
+
+    def consume(self, n, priority=0):
+        """
+        waits until n bytes may be transferred
+        :param n: the number of bytes
+        :param priority: the priority of the transfer, lower values first
+        """
+        while n > 0:
+            if self._rate is None:
+                return
+            part = min(n, self.capacity)
+            self._take(part, priority)
+            n -= part
+
+    def _take(self, n, priority):
+        with self.condition:
+            ticket = (priority, next(self.counter))
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while self._rate is not None:
+                    self._refill()
+                    n = min(n, self.capacity)
+                    if self.waiting[0] != ticket:
+                        self.condition.wait()
+                    elif self.tokens >= n:
+                        self.tokens -= n
+                        return
+                    else:
+                        self.condition.wait((n - self.tokens) / self._rate)
+            finally:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                self.condition.notify_all()
+
+
+# the bucket shared by all storage providers of the process
+throttle = TokenBucket()
+
+
+def set_bandwidth(rate):
+    """
+    sets the bytes per second available to all transfers of the process
+    :param rate: the bytes per second or None for no limit
+    """
+    throttle.rate = None if rate is None else float(rate)
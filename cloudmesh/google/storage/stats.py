@@ -0,0 +1,216 @@
+import atexit
+import json
+import os
+import random
+import threading
+import time
+
+from cloudmesh.common.util import path_expand
+
+
+class Stats(object):
+    """
+    Collects the latency, bytes, retries and failures of the requests made
+    by storage operations such as get, put, list, delete, copy and rename.
+    The latencies of every operation are kept in a reservoir sample from
+    which the percentiles are computed. Optionally every request is also
+    appended as a json line to a file, which can be loaded again to look at
+    the statistics of another process. The file is kept open and written
+    through a buffer that is flushed at most once per flush_interval
+    seconds and when the process exits.
+    """
+
+    # the file the requests are exported to if the stats option is True
+    default_file = "~/.cloudmesh/google-storage-stats.jsonl"
+
+    def __init__(self, size=10000, flush_interval=1.0):
+        """
+        :param size: the number of latencies sampled per operation
+        :param flush_interval: the seconds after which exported requests
+                               are flushed to the file
+        """
+        self.size = size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.filename = None
+        # the export file has its own lock, so that workers recording
+        # requests do not wait for each other's file writes
+        self.file_lock = threading.Lock()
+        self.file = None
+        self.flushed = 0
+        self.reset()
+
+    def reset(self):
+        """
+        forgets all recorded requests
+        """
+        with self.lock:
+            self.operations = {}
+
+    def export(self, filename):
+        """
+        appends every request recorded from now on to a json lines file
+        :param filename: the file or None to stop exporting
+        """
+        filename = None if filename is None else path_expand(filename)
+        with self.lock, self.file_lock:
+            if filename == self.filename:
+                # every provider created with the stats option exports
+                return
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            self.filename = filename
+            if self.filename is not None:
+                os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+                if self.flushed == 0:
+                    atexit.register(self.flush)
+                self.file = open(self.filename, "a")
+                self.flushed = time.time()
+
+    def flush(self):
+        """
+        writes the buffered requests to the export file
+        """
+        with self.file_lock:
+            if self.file is not None:
+                self.file.flush()
+                self.flushed = time.time()
+
+    def record(self, operation, seconds, size=0, retries=0, failed=False):
+        """
+        records a request
+        :param operation: the name of the operation, e.g. get
+        :param seconds: the latency of the request
+        :param size: the bytes moved
+        :param retries: the number of retries needed
+        :param failed: True if the request failed
+        """
+        with self.lock:
+            self._add(operation, seconds, size, retries, failed)
+        if self.file is None:
+            return
+        line = json.dumps({
+            "time": time.time(),
+            "operation": operation,
+            "seconds": seconds,
+            "bytes": size,
+            "retries": retries,
+            "failed": failed,
+        }) + "\n"
+        with self.file_lock:
+            if self.file is not None:
+                self.file.write(line)
+                now = time.time()
+                if now - self.flushed >= self.flush_interval:
+                    self.file.flush()
+                    self.flushed = now
+
+    def _add(self, operation, seconds, size, retries, failed):
+        entry = self.operations.setdefault(operation, {
+            "count": 0,
+            "failed": 0,
+            "bytes": 0,
+            "seconds": 0.0,
+            "retries": 0,
+            "samples": [],
+        })
+        entry["count"] += 1
+        entry["failed"] += int(bool(failed))
+        entry["bytes"] += size or 0
+        entry["seconds"] += seconds
+        entry["retries"] += retries
+        samples = entry["samples"]
+        if len(samples) < self.size:
+            samples.append(seconds)
+        else:
+            i = random.randrange(entry["count"])
+            if i < self.size:
+                samples[i] = seconds
+
+    @staticmethod
+    def percentile(samples, p):
+        """
+        :param samples: the sorted samples
+        :param p: the percentile between 0 and 100
+        :return: the value at the percentile
+        """
+        if not samples:
+            return 0.0
+        i = min(len(samples) - 1, int(round(p / 100.0 * (len(samples) - 1))))
+        return samples[i]
+
+    def summary(self):
+        """
+        :return: dict with count, failures, bytes, retries, throughput and
+                 the p50, p95 and p99 latencies of every operation
+        """
+        result = {}
+        with self.lock:
+            for operation, entry in self.operations.items():
+                samples = sorted(entry["samples"])
+                result[operation] = {
+                    "operation": operation,
+                    "count": entry["count"],
+                    "failed": entry["failed"],
+                    "retries": entry["retries"],
+                    "bytes": entry["bytes"],
+                    "seconds": entry["seconds"],
+                    "bytes_per_sec": entry["bytes"] / entry["seconds"]
+                    if entry["seconds"] > 0 else 0,
+                    "p50": self.percentile(samples, 50),
+                    "p95": self.percentile(samples, 95),
+                    "p99": self.percentile(samples, 99),
+                }
+        return result
+
+    def histogram(self, operation, buckets=None):
+        """
+        :param operation: the name of the operation
+        :param buckets: the upper bounds of the buckets in seconds
+        :return: list of (upper bound, count) of the sampled latencies
+        """
+        buckets = buckets or [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                              float("inf")]
+        with self.lock:
+            samples = list(self.operations.get(operation, {})
+                           .get("samples", []))
+        counts = [0] * len(buckets)
+        for value in samples:
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+        return list(zip(buckets, counts))
+
+    @classmethod
+    def load(cls, filename):
+        """
+        reads the requests exported to a json lines file
+        :param filename: the file
+        :return: Stats
+        """
+        stats = cls()
+        with open(path_expand(filename), "r") as f:
+            for line in f:
+                try:
+                    r = json.loads(line)
+                except ValueError:
+                    continue
+                stats._add(r["operation"], r["seconds"], r["bytes"],
+                           r["retries"], r["failed"])
+        return stats
+
+    @staticmethod
+    def truncate(filename):
+        """
+        removes the requests exported to a json lines file
+        :param filename: the file
+        """
+        filename = path_expand(filename)
+        if os.path.exists(filename):
+            open(filename, "w").close()
+
+
+# the statistics of all storage providers of the process
+stats = Stats()
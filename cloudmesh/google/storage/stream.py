@@ -0,0 +1,385 @@
+import io
+import zlib
+
+
+class MappedRange(io.RawIOBase):
+    """
+    A read only, seekable file object over the byte range [start, end) of a
+    memory map. It is used to hand parts of a large file to the google
+    storage upload functions without copying the part into memory.
+    """
+
+    def __init__(self, buffer, start, end):
+        """
+        :param buffer: an object supporting the buffer protocol, e.g. a mmap
+        :param start: the first byte of the range
+        :param end: the byte after the last byte of the range
+        """
+        super().__init__()
+        self.view = memoryview(buffer)[start:end]
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        else:
+            position = len(self.view) + offset
+        self.position = max(0, position)
+        return self.position
+
+    def readinto(self, b):
+        data = self.view[self.position:self.position + len(b)]
+        n = len(data)
+        b[:n] = data
+        self.position += n
+        return n
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            end = len(self.view)
+        else:
+            end = self.position + size
+        data = bytes(self.view[self.position:end])
+        self.position += len(data)
+        return data
+
+    def close(self):
+        if not self.closed:
+            self.view.release()
+        super().close()
+
+
+class PipeReader(io.RawIOBase):
+    """
+    A readable file object over a stream that can not seek, e.g. a pipe, a
+    file descriptor or an iterator of bytes. Reads return the requested
+    number of bytes unless the stream ends, as the resumable upload of
+    google storage takes a short chunk as the end of the stream. The last
+    keep bytes are buffered, so a chunk can be sent again after a failed
+    request by seeking back to its start.
+    """
+
+    def __init__(self, source, keep=0):
+        """
+        :param source: a readable file object, a file descriptor or an
+                       iterable of bytes
+        :param keep: the number of bytes kept to seek back to
+        """
+        super().__init__()
+        if isinstance(source, int):
+            source = io.open(source, 'rb', closefd=False)
+        if hasattr(source, 'read'):
+            self.source = source.read
+        else:
+            self.source = self._iterate(iter(source))
+        self.keep = keep
+        self.history = bytearray()
+        self.position = 0
+        self.end = 0
+        self.eof = False
+
+    @staticmethod
+    def _iterate(chunks):
+        pending = bytearray()
+
+        def read(size):
+            while len(pending) < size:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                pending.extend(chunk)
+            data = bytes(pending[:size])
+            del pending[:size]
+            return data
+
+        return read
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation('PipeReader can not seek to the end')
+        if not self.end - len(self.history) <= offset <= self.end:
+            raise io.UnsupportedOperation(
+                f'PipeReader can not seek to {offset}')
+        self.position = offset
+        return offset
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = float('inf')
+        parts = []
+        if self.position < self.end:
+            # bytes read again after seeking back
+            start = len(self.history) - (self.end - self.position)
+            part = bytes(self.history[start:start + min(size,
+                                                        len(self.history))])
+            parts.append(part)
+            self.position += len(part)
+            size -= len(part)
+        while size > 0 and not self.eof:
+            part = self.source(min(size, 2 ** 20))
+            if not part:
+                self.eof = True
+                break
+            parts.append(part)
+            self.position += len(part)
+            self.end += len(part)
+            size -= len(part)
+            if self.keep:
+                self.history.extend(part)
+                del self.history[:max(0, len(self.history) - self.keep)]
+        return b''.join(parts)
+
+
+class HashingReader(io.RawIOBase):
+    """
+    Wraps a readable file object and passes every byte read to a digest.
+    Bytes read again after seeking backwards, as done when an upload is
+    retried, are only hashed once.
+    """
+
+    def __init__(self, raw, digest):
+        """
+        :param raw: the file object to read from
+        :param digest: an object with an update method, e.g. StreamingDigest
+        """
+        super().__init__()
+        self.raw = raw
+        self.digest = digest
+        self.position = raw.tell()
+        self.hashed = self.position
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self.raw.seekable()
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self.position = self.raw.seek(offset, whence)
+        return self.position
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        end = self.position + len(data)
+        if self.position > self.hashed:
+            raise ValueError('Can not hash a stream read with gaps')
+        if end > self.hashed:
+            self.digest.update(data[self.hashed - self.position:])
+            self.hashed = end
+        self.position = end
+        return data
+
+
+class HashingWriter(io.RawIOBase):
+    """
+    Wraps a writable file object and passes every byte written to a digest.
+    """
+
+    def __init__(self, raw, digest):
+        """
+        :param raw: the file object to write to
+        :param digest: an object with an update method, e.g. StreamingDigest
+        """
+        super().__init__()
+        self.raw = raw
+        self.digest = digest
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        n = self.raw.write(b)
+        self.digest.update(b)
+        return n
+
+    def flush(self):
+        self.raw.flush()
+
+
+class GzipReader(io.RawIOBase):
+    """
+    Wraps a readable file object and returns its content gzip compressed
+    while it is read, so that no compressed copy has to be staged on disk.
+    The stream can not seek, but reports its position as required by the
+    resumable upload of google storage.
+    """
+
+    def __init__(self, raw, level=6):
+        """
+        :param raw: the file object to read from
+        :param level: the compression level
+        """
+        super().__init__()
+        self.raw = raw
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        self.buffer = b''
+        self.eof = False
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self.bytes_out
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET and offset == self.bytes_out:
+            return offset
+        raise io.UnsupportedOperation('GzipReader can not seek')
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def read(self, size=-1):
+        while not self.eof and (size is None or size < 0
+                                or len(self.buffer) < size):
+            data = self.raw.read(2 ** 20)
+            if data:
+                self.bytes_in += len(data)
+                self.buffer += self.compressor.compress(data)
+            else:
+                self.buffer += self.compressor.flush()
+                self.eof = True
+        if size is None or size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        self.bytes_out += len(data)
+        return data
+
+
+class GunzipWriter(io.RawIOBase):
+    """
+    Wraps a writable file object and decompresses the gzip data written to
+    it on the fly.
+    """
+
+    def __init__(self, raw):
+        """
+        :param raw: the file object to write the decompressed data to
+        """
+        super().__init__()
+        self.raw = raw
+        self.decompressor = zlib.decompressobj(31)
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.bytes_in += len(b)
+        data = self.decompressor.decompress(b)
+        self.bytes_out += len(data)
+        self.raw.write(data)
+        return len(b)
+
+    def finish(self):
+        """
+        writes the remaining decompressed data
+        """
+        data = self.decompressor.flush()
+        self.bytes_out += len(data)
+        self.raw.write(data)
+
+
+class ThrottledReader(io.RawIOBase):
+    """
+    Wraps a readable file object and takes tokens for every byte read from
+    a token bucket, which limits the bandwidth used by the reader.
+    """
+
+    def __init__(self, raw, throttle, priority=0):
+        """
+        :param raw: the file object to read from
+        :param throttle: the TokenBucket
+        :param priority: the priority of the transfer, lower values first
+        """
+        super().__init__()
+        self.raw = raw
+        self.throttle = throttle
+        self.priority = priority
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self.raw.seekable()
+
+    def tell(self):
+        return self.raw.tell()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.raw.seek(offset, whence)
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.throttle.consume(len(data), self.priority)
+        return data
+
+
+class ThrottledWriter(io.RawIOBase):
+    """
+    Wraps a writable file object and takes tokens for every byte written
+    from a token bucket, which limits the bandwidth used by the writer.
+    """
+
+    def __init__(self, raw, throttle, priority=0):
+        """
+        :param raw: the file object to write to
+        :param throttle: the TokenBucket
+        :param priority: the priority of the transfer, lower values first
+        """
+        super().__init__()
+        self.raw = raw
+        self.throttle = throttle
+        self.priority = priority
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.throttle.consume(len(b), self.priority)
+        return self.raw.write(b)
+
+    def flush(self):
+        self.raw.flush()
@@ -35,6 +35,7 @@ cloudmesh-sys
 cloudmesh-inventory
 cloudmesh-configuration
 google-cloud-storage
+google-crc32c
 google-api-python-client
 google-auth-httplib2
 google-auth-oauthlib 
@@ -82,6 +83,10 @@ setup(
         "Programming Language :: Python :: 3.8",
     ],
     install_requires=requiers,
+    extras_require={
+        # needed by cloudmesh.google.storage.AsyncProvider
+        "async": ["aiohttp"],
+    },
     tests_require=[
         "flake8",
         "coverage",
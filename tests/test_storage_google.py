@@ -87,6 +87,14 @@ class TestStorage(object):
         config = Config()
         bucket=config[f'cloudmesh.storage.{cloud}.default.directory']
 
+    def test_bucket_exists(self):
+        HEADING()
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud)
+        StopWatch.start("bucket exists")
+        assert provider.bucket_exists()
+        StopWatch.stop("bucket exists")
+
     def create_local_file(self, location, content):
         d = Path(os.path.dirname(path_expand(location)))
         print()
@@ -132,6 +140,256 @@ class TestStorage(object):
 
         assert test_file is not None
 
+    def test_put_recursive(self):
+        HEADING()
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud, workers=4)
+        src = "~/.cloudmesh/storage/test/a"
+        dst = 'recursive/a'
+        StopWatch.start("put recursive")
+        result = provider.put(src, dst, recursive=True)
+        StopWatch.stop("put recursive")
+        pprint(result)
+
+        assert result['failed'] == 0
+        assert 'recursive/a/b/c/c.txt' in result['objectlist']
+
+    def test_get_sliced(self):
+        HEADING()
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud, slice_threshold=1, slice_size=4)
+        src = "recursive/a"
+        dst = "~/.cloudmesh/storage/test/google_sliced"
+        StopWatch.start("get sliced")
+        result = provider.get(src, dst, recursive=True)
+        StopWatch.stop("get sliced")
+        pprint(result)
+
+        assert result['failed'] == 0
+        contents = {}
+        for file in result['files']:
+            with open(file['destination']) as f:
+                contents[file['name']] = f.read()
+        assert contents['recursive/a/a.txt'] == "content of a"
+        assert contents['recursive/a/b/c/c.txt'] == "content of c"
+
+    def test_put_composite(self):
+        HEADING()
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud, composite_threshold=1,
+                            composite_parts=4)
+        content = "content of a composite upload\n" * 1000
+        self.create_local_file(
+            "~/.cloudmesh/storage/test/composite/large.txt", content)
+        src = path_expand("~/.cloudmesh/storage/test/composite/large.txt")
+        dst = 'composite/large.txt'
+        StopWatch.start("put composite")
+        result = provider.put(src, dst)
+        StopWatch.stop("put composite")
+        pprint(result)
+
+        assert result['message'] == "Source Uploaded"
+        assert len(result['parts']) == 4
+        assert b''.join(provider.get_stream(dst)) == content.encode()
+        # the temporary parts are removed
+        assert [blob['name'] for blob in provider.list('composite/')] == \
+            [dst]
+
+    def test_put_resumable(self):
+        HEADING()
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(
+            service=cloud, resumable_threshold=1, chunk_size=262144,
+            journal="~/.cloudmesh/storage/test/resumable/journal.jsonl")
+        content = os.urandom(600 * 1024)
+        src = path_expand("~/.cloudmesh/storage/test/resumable/large.bin")
+        os.makedirs(os.path.dirname(src), exist_ok=True)
+        with open(src, 'wb') as f:
+            f.write(content)
+        dst = 'resumable/large.bin'
+        key = f'put:{provider.bucket.name}/{dst}'
+
+        # an interrupted run that sent the first chunk
+        uri = provider.bucket.blob(dst).create_resumable_upload_session(
+            size=len(content))
+        provider.client._http.put(
+            uri, data=content[:262144],
+            headers={'Content-Range': f'bytes 0-262143/{len(content)}'})
+        provider.journal.put(key, {
+            'source': src,
+            'size': len(content),
+            'mtime': os.stat(src).st_mtime,
+            'uri': uri,
+            'offset': 262144,
+        })
+
+        StopWatch.start("put resumable")
+        result = provider.put(src, dst)
+        StopWatch.stop("put resumable")
+        pprint(result)
+
+        assert result['message'] == "Source Uploaded"
+        assert result['resumed_from'] == 262144
+        assert provider.journal.get(key) is None
+        assert b''.join(provider.get_stream(dst)) == content
+
+    def test_put_throttled(self):
+        HEADING()
+        import time
+        from cloudmesh.google.storage import scheduler
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud, bandwidth=256 * 1024)
+        src = path_expand("~/.cloudmesh/storage/test/throttled/large.bin")
+        os.makedirs(os.path.dirname(src), exist_ok=True)
+        with open(src, 'wb') as f:
+            f.write(os.urandom(512 * 1024))
+        dst = 'throttled/large.bin'
+        try:
+            StopWatch.start("put throttled")
+            start = time.time()
+            result = provider.put(src, dst)
+            seconds = time.time() - start
+            StopWatch.stop("put throttled")
+        finally:
+            # the limit applies to all transfers of the process
+            scheduler.set_bandwidth(None)
+        pprint(result)
+
+        assert result['message'] == "Source Uploaded"
+        # one second worth of bytes is available at once, the rest waits
+        assert seconds >= 0.9
+
+    def test_sync(self):
+        HEADING()
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud)
+        src = "~/.cloudmesh/storage/test/a"
+        dst = 'sync/a'
+        StopWatch.start("sync")
+        result = provider.sync(src, dst)
+        StopWatch.stop("sync")
+        pprint(result)
+        assert result['failed'] == 0
+
+        StopWatch.start("sync unchanged")
+        result = provider.sync(src, dst)
+        StopWatch.stop("sync unchanged")
+        assert result['count'] == 0
+
+    def test_put_compressed(self):
+        HEADING()
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud)
+        self.create_local_file("~/.cloudmesh/storage/test/log/large.log",
+                               "a line of a log file\n" * 10000)
+        src = path_expand("~/.cloudmesh/storage/test/log/large.log")
+        dst = 'log/large.log'
+        StopWatch.start("put compressed")
+        result = provider.put(src, dst, compress=True)
+        StopWatch.stop("put compressed")
+        pprint(result)
+        assert result['compression_ratio'] > 1
+
+        StopWatch.start("get compressed")
+        result = provider.get('log/', "~/.cloudmesh/storage/test/google_log",
+                              recursive=True)
+        StopWatch.stop("get compressed")
+        pprint(result)
+        assert result['failed'] == 0
+
+    def test_open(self):
+        HEADING()
+        import io
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud, block_size=4)
+        StopWatch.start("open seek read")
+        with provider.open('a/a.txt') as f:
+            f.seek(-4, io.SEEK_END)
+            tail = f.read()
+            f.seek(0)
+            head = f.read(7)
+            summary = f.summary()
+        StopWatch.stop("open seek read")
+        pprint(summary)
+        assert tail == b"of a"
+        assert head == b"content"
+
+        with provider.open('a/a.txt', 'r') as f:
+            assert f.read() == "content of a"
+
+    def test_packed(self):
+        HEADING()
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud)
+        for i in range(100):
+            self.create_local_file(
+                f"~/.cloudmesh/storage/test/small/{i % 10}/{i}.txt",
+                f"content of {i}")
+        StopWatch.start("put packed")
+        result = provider.put_packed("~/.cloudmesh/storage/test/small",
+                                     'packed', shard_size=512)
+        StopWatch.stop("put packed")
+        pprint(result)
+        assert result['failed'] == 0
+        assert result['members'] == 100
+
+        StopWatch.start("get packed member")
+        data = provider.get_packed('packed', '7/57.txt')
+        StopWatch.stop("get packed member")
+        assert data == b"content of 57"
+
+        result = provider.get_packed(
+            'packed', destination="~/.cloudmesh/storage/test/unpacked")
+        assert result['failed'] == 0
+
+    def test_put_dedup(self):
+        HEADING()
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud)
+        src = "~/.cloudmesh/storage/test/a"
+        provider.put(src, 'dedup', recursive=True)
+
+        StopWatch.start("put dedup")
+        result = provider.put(src, 'dedup', recursive=True, dedup=True)
+        StopWatch.stop("put dedup")
+        pprint(result)
+        assert result['skipped'] == result['count']
+
+    def test_cache(self):
+        HEADING()
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud,
+                            cache="~/.cloudmesh/storage/test/cache")
+        provider.cache.clear()
+        dst = "~/.cloudmesh/storage/test/google_cache"
+        StopWatch.start("get cache miss")
+        result = provider.get('a', dst, recursive=True)
+        StopWatch.stop("get cache miss")
+        assert result['cache']['misses'] > 0
+
+        StopWatch.start("get cache hit")
+        result = provider.get('a', dst, recursive=True)
+        StopWatch.stop("get cache hit")
+        pprint(result['cache'])
+        assert result['cache']['hits'] == result['cache']['misses']
+        assert result['cache']['bytes_saved'] > 0
+
+    def test_stream(self):
+        HEADING()
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud)
+        lines = (f'line {i}\n'.encode() for i in range(100000))
+        StopWatch.start("put stream")
+        result = provider.put_stream(lines, 'stream/lines.txt')
+        StopWatch.stop("put stream")
+        pprint(result)
+        assert result['message'] == "Source Uploaded"
+
+        StopWatch.start("get stream")
+        data = b''.join(provider.get_stream('stream/lines.txt'))
+        StopWatch.stop("get stream")
+        assert data == b''.join(f'line {i}\n'.encode()
+                                for i in range(100000))
 
     def test_get(self):
         HEADING()
@@ -145,6 +403,20 @@ class TestStorage(object):
 
         assert file is not None
 
+    def test_get_recursive(self):
+        HEADING()
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud, workers=4)
+        src = "a"
+        dst = "~/.cloudmesh/storage/test/google_test_recursive"
+        StopWatch.start("get recursive")
+        result = provider.get(src, dst, recursive=True)
+        StopWatch.stop("get recursive")
+        pprint(result)
+
+        assert result['failed'] == 0
+        assert result['count'] == len(result['objectlist'])
+
     def test_list_all(self):
         HEADING()
         src = ''
@@ -159,14 +431,94 @@ class TestStorage(object):
         contents = provider.list(src)
         StopWatch.stop("list")
 
+    def test_list_fields(self):
+        HEADING()
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud)
+        StopWatch.start("list fields")
+        contents = list(provider.list('a/', fields='name,size',
+                                      page_size=100))
+        StopWatch.stop("list fields")
+        pprint(contents)
+        assert {'name': 'a/a.txt', 'size': len("content of a")} in contents
+
+        directories = list(provider.list('a/', dir_only=True))
+        assert {'name': 'a/b/'} in directories
+
+    def test_search(self):
+        HEADING()
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud)
+        StopWatch.start("search")
+        found = [blob['name'] for blob in provider.search('a', '*.txt')]
+        StopWatch.stop("search")
+        assert 'a/a.txt' in found
+        assert 'a/b/b.txt' not in found
+
+        found = [blob['name']
+                 for blob in provider.search('a', 'b.txt', recursive=True)]
+        assert 'a/b/b.txt' in found
+
+    def test_index(self):
+        HEADING()
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud, index=True)
+        StopWatch.start("index refresh")
+        result = provider.refresh_index('a/')
+        StopWatch.stop("index refresh")
+        pprint(result)
+
+        StopWatch.start("index exists")
+        assert provider.exists('a/a.txt')
+        StopWatch.stop("index exists")
+        assert provider.size('a/a.txt') == len("content of a")
+        assert not provider.exists('a/does-not-exist.txt')
+
+    def test_async_put_get(self):
+        HEADING()
+        import asyncio
+        from cloudmesh.google.storage.AsyncProvider import AsyncProvider
+
+        async def transfer():
+            async with AsyncProvider(service=cloud) as provider:
+                put = await provider.put('~/.cloudmesh/storage/test/a',
+                                         'async', recursive=True)
+                names = [blob['name']
+                         async for blob in provider.list('async/')]
+                get = await provider.get('async', '~/.cloudmesh/storage/async',
+                                         recursive=True)
+                delete = await provider.delete('async/')
+                return put, names, get, delete
+
+        StopWatch.start("async put get")
+        put, names, get, delete = asyncio.run(transfer())
+        StopWatch.stop("async put get")
+        pprint(put)
+        assert put['failed'] == 0
+        assert 'async/a.txt' in names
+        assert get['failed'] == 0
+        assert delete['failed'] == 0
+
+    def test_stats(self):
+        HEADING()
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud)
+        list(provider.list('a'))
+        summary = provider.stats()
+        pprint(summary)
+        assert summary['list']['count'] > 0
+        assert summary['list']['p50'] <= summary['list']['p99']
+
     def test_delete(self):
         HEADING()
         src = 'top_folder5/sub_folder7/'
         provider.create_dir(src)
 
         StopWatch.start("delete")
-        provider.delete(src)
+        result = provider.delete(src)
         StopWatch.stop("delete")
+        pprint(result)
+        assert result['failed'] == 0
 
     def test_blob_metadata(self):
         HEADING()
@@ -177,6 +529,18 @@ class TestStorage(object):
         provider.blob_metadata(blob_name)
         StopWatch.stop("test_blob_metadata")
 
+    def test_blobs_metadata(self):
+        HEADING()
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud)
+        names = ['a/a.txt', 'a/does-not-exist.txt']
+        StopWatch.start("test_blobs_metadata")
+        records = {r['name']: r for r in provider.blobs_metadata(names)}
+        StopWatch.stop("test_blobs_metadata")
+        pprint(records)
+        assert records['a/a.txt']['size'] == len("content of a")
+        assert records['a/does-not-exist.txt']['status'] == 'not_found'
+
     # blob_metadata(f'{bucket_name}', 'a10/atest.txt')
 
     def test_rename_blob(self):
@@ -192,6 +556,18 @@ class TestStorage(object):
 
     # rename_blob(f'{bucket_name}', '{blob_name}', '{new_name}')
 
+    def test_rename_prefix(self):
+        HEADING()
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud)
+        provider.create_dir('top_folder12/sub_folder7/test2')
+        StopWatch.start("test_rename_prefix")
+        result = provider.rename_prefix('top_folder12/', 'top_folder13/')
+        StopWatch.stop("test_rename_prefix")
+        pprint(result)
+        assert result['failed'] == 0
+        assert result['deleted']['failed'] == 0
+
     def test_copy_blob_btw_buckets(self):
         HEADING()
         from cloudmesh.google.storage.Provider import Provider
@@ -205,6 +581,16 @@ class TestStorage(object):
 
     # copy_blob(f'{bucket_name}', 'download_file1', 'my-new-bucket_shre', 'a1692_new/a18_new')
 
+    def test_copy_prefix(self):
+        HEADING()
+        from cloudmesh.google.storage.Provider import Provider
+        provider = Provider(service=cloud)
+        StopWatch.start("test_copy_prefix")
+        result = provider.copy_prefix('a/', 'cloudmesh_gcp2', 'copy/a/')
+        StopWatch.stop("test_copy_prefix")
+        pprint(result)
+        assert result['failed'] == 0
+
     def test_create_bucket(self):
         HEADING()
         from cloudmesh.google.storage.Provider import Provider
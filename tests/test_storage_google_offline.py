@@ -0,0 +1,266 @@
+###############################################################
+# pytest -v --capture=no tests/test_storage_google_offline.py
+###############################################################
+import io
+import os
+import tarfile
+import threading
+import time
+
+import google_crc32c
+import pytest
+
+from cloudmesh.google.storage import checksum
+from cloudmesh.google.storage import pack
+from cloudmesh.google.storage.blobfile import BlobFile
+from cloudmesh.google.storage.Provider import Provider
+from cloudmesh.google.storage.scheduler import TokenBucket
+from cloudmesh.google.storage.stream import PipeReader
+
+credentials = os.path.join(os.path.dirname(__file__),
+                           'google_sample_credentials.json')
+
+
+class Blob(object):
+    """
+    stands in for a listed blob
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.size = len(name)
+        self.generation = 1
+        self.crc32c = None
+        self.md5_hash = None
+        self.updated = None
+        self.content_encoding = None
+
+
+class Page(list):
+    prefixes = ()
+
+
+class Listing(object):
+
+    def __init__(self, blobs):
+        self.pages = [Page(blobs)]
+
+
+class Client(object):
+    """
+    stands in for the storage client, bucket handles are created without a
+    request and listings are served from names
+    """
+
+    def __init__(self, names=()):
+        self.names = sorted(names)
+
+    def bucket(self, name):
+        return ('bucket', name)
+
+    def list_blobs(self, bucket, prefix=None, delimiter=None, **kwargs):
+        blobs = []
+        for name in self.names:
+            rest = name[len(prefix or ''):]
+            if name.startswith(prefix or '') and \
+                    not (delimiter and delimiter in rest):
+                blobs.append(Blob(name))
+        return Listing(blobs)
+
+
+class TestStorageOffline(object):
+
+    def test_provider_from_json(self, tmp_path):
+        provider = Provider(json=credentials,
+                            bucket='cloudmesh-offline',
+                            journal=str(tmp_path / 'journal.jsonl'),
+                            index=str(tmp_path / 'index.db'),
+                            cache=str(tmp_path / 'cache'))
+        provider._client = Client()
+
+        assert provider.bucket == ('bucket', 'cloudmesh-offline')
+        assert provider.index is not None
+        assert list(provider.index.list('cloudmesh-offline')) == []
+        assert provider.journal.get('missing') is None
+        assert provider.cache.summary()['hits'] == 0
+        assert provider.block_size > 0
+
+    def test_crc32c_combine(self):
+        first = os.urandom(1000)
+        second = os.urandom(3000)
+
+        def value(data):
+            return int.from_bytes(google_crc32c.Checksum(data).digest(), 'big')
+
+        assert checksum.crc32c_combine(value(first), value(second),
+                                       len(second)) == value(first + second)
+        assert checksum.crc32c_combine(0, value(second), len(second)) == \
+            value(second)
+
+    def test_streaming_digest_close(self):
+        threads = threading.active_count()
+        with checksum.StreamingDigest() as digest:
+            digest.update(b'a failed transfer')
+        assert not digest.thread.is_alive()
+        assert threading.active_count() == threads
+
+        digest = checksum.StreamingDigest()
+        digest.update(b'content')
+        assert digest.finish()['crc32c'] == checksum.encode(
+            google_crc32c.Checksum(b'content').digest())
+        digest.close()
+
+    def test_token_bucket_rate(self):
+        bucket = TokenBucket(rate=100000)
+        start = time.time()
+        # the bucket starts with one second worth of tokens
+        bucket.consume(100000)
+        assert time.time() - start < 0.2
+        bucket.consume(50000)
+        assert 0.4 <= time.time() - start < 1.5
+
+    def test_token_bucket_priority(self):
+        bucket = TokenBucket(rate=10000)
+        bucket.consume(10000)
+        done = []
+
+        def consume(priority):
+            bucket.consume(5000, priority)
+            done.append(priority)
+
+        bulk = threading.Thread(target=consume, args=(1,))
+        bulk.start()
+        time.sleep(0.05)
+        small = threading.Thread(target=consume, args=(0,))
+        small.start()
+        bulk.join()
+        small.join()
+        assert done == [0, 1]
+
+    def test_token_bucket_rate_change(self):
+        bucket = TokenBucket(rate=1000)
+        bucket.consume(1000)
+        transfer = threading.Thread(target=bucket.consume, args=(100000,))
+        transfer.start()
+        time.sleep(0.1)
+        # lifting the limit releases the waiting transfer
+        bucket.rate = None
+        transfer.join(1)
+        assert not transfer.is_alive()
+
+    def test_pipe_reader_seek_back(self):
+        chunks = (bytes([i]) * 100 for i in range(10))
+        reader = PipeReader(chunks, keep=200)
+        assert reader.read(250) == bytes([0]) * 100 + bytes([1]) * 100 + \
+            bytes([2]) * 50
+        # a failed request sends its chunk again
+        reader.seek(100)
+        assert reader.read(200) == bytes([1]) * 100 + bytes([2]) * 100
+        assert reader.tell() == 300
+        with pytest.raises(io.UnsupportedOperation):
+            # only the last keep bytes can be read again
+            reader.seek(0)
+        assert len(reader.read()) == 700
+        assert reader.read(10) == b''
+        assert reader.end == 1000
+
+    @staticmethod
+    def ranges(data):
+        # a fetch function over data that records the requested ranges
+        requested = []
+
+        def fetch(start, end):
+            requested.append((start, end))
+            return data[start:end + 1]
+
+        return fetch, requested
+
+    def test_blob_file_lru(self):
+        data = bytes(range(100))
+        fetch, requested = self.ranges(data)
+        f = BlobFile(fetch, 'blob', len(data), block_size=10, readahead=0,
+                     cache_blocks=2)
+        f.seek(0)
+        assert f.read(10) == data[:10]
+        f.seek(15)
+        assert f.read(5) == data[15:20]
+        f.seek(5)
+        assert f.read(5) == data[5:10]
+        # block 2 evicts block 1, the least recently used one
+        f.seek(20)
+        f.read(1)
+        f.seek(10)
+        f.read(1)
+        assert requested == [(0, 9), (10, 19), (20, 29), (10, 19)]
+        assert f.summary()['hits'] == 1
+        f.seek(-3, io.SEEK_END)
+        assert f.read() == data[-3:]
+        f.close()
+
+    def test_blob_file_readahead(self):
+        data = os.urandom(100)
+        fetch, requested = self.ranges(data)
+        with BlobFile(fetch, 'blob', len(data), block_size=10,
+                      readahead=30) as f:
+            assert f.read(20) == data[:20]
+            # the second sequential block starts the readahead
+            for _ in range(100):
+                if len(requested) >= 5:
+                    break
+                time.sleep(0.01)
+            assert sorted(requested)[:5] == \
+                [(0, 9), (10, 19), (20, 29), (30, 39), (40, 49)]
+            assert f.read() == data[20:]
+            summary = f.summary()
+        # every block is fetched once
+        assert summary['requests'] == 10
+        assert summary['bytes_fetched'] == 100
+
+    def test_tar_stream_offsets(self, tmp_path):
+        files = []
+        for i in range(5):
+            path = tmp_path / f'{i}.txt'
+            path.write_bytes(b'content %d ' % i * (i * 300 + 1))
+            files.append((str(path), f'dir/{i}.txt'))
+        groups = list(pack.shards(files, 1000))
+        assert sum(len(group) for group in groups) == 5
+        index = pack.PackIndex()
+        index.shards = [f'shard-{i}.tar' for i in range(len(groups))]
+        shards = [b''.join(pack.tar_stream(group, index, shard))
+                  for shard, group in enumerate(groups)]
+
+        index = pack.PackIndex.loads(index.dumps())
+        for path, name in files:
+            with open(path, 'rb') as f:
+                content = f.read()
+            entry = index.get(name)
+            data = shards[index.shards.index(entry['shard'])]
+            start = entry['offset']
+            assert data[start:start + entry['length']] == content
+            assert entry['crc32c'] == checksum.encode(
+                google_crc32c.Checksum(content).digest())
+        # the shards are valid tar archives
+        for data in shards:
+            assert len(data) % tarfile.RECORDSIZE == 0
+            with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+                for member in archive.getmembers():
+                    assert archive.extractfile(member).read() == \
+                        (tmp_path / os.path.basename(member.name)).read_bytes()
+
+    def test_search(self):
+        provider = Provider(json=credentials, bucket='cloudmesh-offline')
+        provider._client = Client(['a/x.txt', 'a/y.csv', 'a/b/x.txt',
+                                   'a/b/c/x.txt', 'a/d/x.txt', 'b/x.txt'])
+
+        def search(directory, pattern, recursive=False):
+            return sorted(record['name'] for record in
+                          provider.search(directory, pattern, recursive))
+
+        assert search('a', '*.txt') == ['a/x.txt']
+        assert search('a', 'b/*.txt') == ['a/b/x.txt']
+        assert search('a', '*/x.txt') == ['a/b/x.txt', 'a/d/x.txt']
+        assert search('a', 'x.txt', recursive=True) == \
+            ['a/b/c/x.txt', 'a/b/x.txt', 'a/d/x.txt', 'a/x.txt']
+        assert search('a', 'b/*.txt', recursive=True) == \
+            ['a/b/c/x.txt', 'a/b/x.txt']
+        assert search('', '*.csv', recursive=True) == ['a/y.csv']